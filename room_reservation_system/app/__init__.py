@@ -1,36 +1,100 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from flask_wtf import CSRFProtect
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.middleware.proxy_fix import ProxyFix
+import click
 import os
+from collections.abc import Mapping
 
 # Initialize extensions
 db = SQLAlchemy()
 login_manager = LoginManager()
-migrate = Migrate()
 csrf = CSRFProtect()
 
-def create_app():
+from app.availability import Availability
+from app.catalog import RoomCatalog
+from app.identity import IdentityCache
+from app.hashing import PasswordHasher
+from app.metrics import Metrics
+from app.jobs import JobQueue
+from app.events import EventBroker
+from app.assets import Assets
+from app.pagecache import PageCache
+from app.ratelimit import RateLimiter
+from app.database import apply_sqlite_pragmas, init_migrations
+availability = Availability()
+room_catalog = RoomCatalog()
+identity_cache = IdentityCache()
+password_hasher = PasswordHasher()
+metrics = Metrics()
+jobs = JobQueue()
+events = EventBroker()
+assets = Assets()
+page_cache = PageCache()
+rate_limiter = RateLimiter()
+
+def create_app(config=None):
     app = Flask(__name__)
     
-    # Load configuration
-    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-default-secret-key')
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Load configuration: the Config defaults, then the chosen profile (an
+    # object or import string, APP_CONFIG by default), then FLASK_* environment
+    # variables (e.g. FLASK_SQLALCHEMY_ENGINE_OPTIONS__pool_size=20). A mapping
+    # passed in by tests and scripts overrides all of them.
+    app.config.from_object('config.Config')
+    if config is None:
+        config = os.getenv('APP_CONFIG')
+    if config is not None and not isinstance(config, Mapping):
+        app.config.from_object(config)
+    app.config.from_prefixed_env()
+    if isinstance(config, Mapping):
+        app.config.from_mapping(config)
+
+    # Compiled templates are kept on disk, so a new worker loads bytecode
+    # instead of parsing every template again (`flask assets build` fills
+    # the cache ahead of time). Entries are keyed by the template source, so
+    # an edited template is recompiled.
+    if app.config['TEMPLATE_BYTECODE_CACHE']:
+        directory = app.config['TEMPLATE_CACHE_DIR'] or os.path.join(app.instance_path, 'jinja_cache')
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(directory)}
+    
+    # Behind PROXY_FIX_X_FOR reverse proxies, take the client address from
+    # X-Forwarded-For; per-IP rate limits would otherwise see only the proxy.
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
     
     # Initialize extensions with the app
     db.init_app(app)
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
     login_manager.init_app(app)
-    migrate.init_app(app, db)
+    # Flask-Migrate brings in Alembic, a large share of the import time;
+    # only the `flask db` commands need it, so web workers skip it. Scripts
+    # call app.database.upgrade_schema() or reset_schema() instead.
+    if click.get_current_context(silent=True) is not None:
+        init_migrations(app)
     csrf.init_app(app)
+    availability.init_app(app)
+    room_catalog.init_app(app)
+    identity_cache.init_app(app)
+    password_hasher.init_app(app)
+    metrics.init_app(app)
+    jobs.init_app(app)
+    events.init_app(app)
+    assets.init_app(app)
+    page_cache.init_app(app)
+    rate_limiter.init_app(app)
 
     # Register blueprints
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
 
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-    
+    from app.archive import archive_cli
+    app.cli.add_command(archive_cli)
+
+    from app.utilization import utilization_cli
+    app.cli.add_command(utilization_cli)
+
     return app
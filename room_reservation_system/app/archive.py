@@ -0,0 +1,98 @@
+import time as clock
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db, waitlist
+
+COLUMNS = ['id', 'date', 'time', 'end_time', 'canceled', 'user_id', 'room_id']
+
+
+def _batches(table, criteria, batch_size, pause):
+    # Walks the table by primary key, one short transaction per batch of
+    # matching ids, so no write lock is held for long and each batch resumes
+    # where the last stopped instead of rescanning from the start.
+    last_id = 0
+    while True:
+        ids = db.session.scalars(
+            db.select(table.c.id).where(table.c.id > last_id, criteria)
+            .order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not ids:
+            db.session.rollback()
+            return
+        started = clock.perf_counter()
+        yield ids
+        db.session.commit()
+        current_app.logger.debug('Batch of %d rows committed in %.1f ms', len(ids),
+                                 (clock.perf_counter() - started) * 1000)
+        last_id = ids[-1]
+        if pause:
+            clock.sleep(pause)
+
+
+def archive_reservations(before=None, batch_size=None, pause=None):
+    from app.models import Reservation, ReservationHistory
+
+    config = current_app.config
+    if before is None:
+        before = date.today() - timedelta(days=config['ARCHIVE_AFTER_DAYS'])
+    batch_size = batch_size or config['ARCHIVE_BATCH_SIZE']
+    pause = config['ARCHIVE_PAUSE'] if pause is None else pause
+
+    live = Reservation.__table__
+    history = ReservationHistory.__table__
+    criteria = db.or_(live.c.canceled == db.true(), live.c.date < before)
+    moved = 0
+    for ids in _batches(live, criteria, batch_size, pause):
+        selected = db.and_(live.c.id.in_(ids), criteria)
+        db.session.execute(history.insert().from_select(
+            COLUMNS + ['archived_at'],
+            db.select(*[live.c[column] for column in COLUMNS],
+                      db.literal(datetime.utcnow(), db.DateTime)).where(selected),
+        ))
+        moved += db.session.execute(live.delete().where(selected)).rowcount
+    return moved
+
+
+def purge_history(days=None, batch_size=None, pause=None):
+    from app.models import ReservationHistory
+
+    config = current_app.config
+    days = config['HISTORY_RETENTION_DAYS'] if days is None else days
+    if days is None:
+        return 0
+    history = ReservationHistory.__table__
+    criteria = history.c.date < date.today() - timedelta(days=days)
+    purged = 0
+    for ids in _batches(history, criteria, batch_size or config['ARCHIVE_BATCH_SIZE'],
+                        config['ARCHIVE_PAUSE'] if pause is None else pause):
+        purged += db.session.execute(history.delete().where(history.c.id.in_(ids))).rowcount
+    return purged
+
+
+# Meant to run from cron, e.g. nightly; it is safe to run while the app serves
+# requests.
+archive_cli = AppGroup('archive', help='Move old reservations to the history table.')
+
+
+@archive_cli.command('run')
+@click.option('--before', type=click.DateTime(['%Y-%m-%d']),
+              help='Archive live reservations before this date (default: ARCHIVE_AFTER_DAYS ago).')
+@click.option('--batch-size', type=int, help='Rows per transaction (default: ARCHIVE_BATCH_SIZE).')
+@click.option('--pause', type=float, help='Seconds between batches (default: ARCHIVE_PAUSE).')
+def run_command(before, batch_size, pause):
+    started = clock.perf_counter()
+    moved = archive_reservations(before.date() if before else None, batch_size, pause)
+    purged = purge_history(batch_size=batch_size, pause=pause)
+    expired = waitlist.purge_expired()
+    click.echo(f'Archived {moved} reservation(s), purged {purged} from history and {expired} expired '
+               f'waitlist entries in {clock.perf_counter() - started:.1f}s.')
+
+
+@archive_cli.command('purge')
+@click.option('--days', type=int, help='Delete history older than this (default: HISTORY_RETENTION_DAYS).')
+def purge_command(days):
+    click.echo(f'Purged {purge_history(days)} reservation(s) from history.')
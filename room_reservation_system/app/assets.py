@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip variants are built without it
+    brotli = None
+
+BUILD_DIR = 'build'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.json', '.txt')
+# (suffix, Content-Encoding), best first.
+ENCODINGS = [('.br', 'br'), ('.gz', 'gzip')]
+FAR_FUTURE = 365 * 24 * 3600
+
+
+class _State:
+    def __init__(self):
+        self.manifest = {}
+        self.variants = {}
+
+
+# Content-hashed static files. `flask assets build` copies every file under
+# static/ to static/build/ with a hash of its content in the name (plus .gz
+# and, with the brotli package installed, .br variants of text files) and
+# writes a manifest. With a manifest present, url_for('static', ...) returns
+# the hashed name, which is served with a far-future, immutable
+# Cache-Control: a changed file gets a new URL, so browsers never need to
+# revalidate. Without a build, static files are served as before.
+class Assets:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_MAX_AGE', FAR_FUTURE)
+        state = app.extensions['assets'] = _State()
+        self.load(app)
+
+        @app.url_defaults
+        def fingerprint(endpoint, values):
+            if endpoint == 'static':
+                hashed = state.manifest.get(values.get('filename'))
+                if hashed is not None:
+                    values['filename'] = hashed
+
+        app.view_functions['static'] = self.send_static
+        app.cli.add_command(assets_cli)
+
+    @property
+    def _state(self):
+        return current_app.extensions['assets']
+
+    def load(self, app):
+        state = app.extensions['assets']
+        path = os.path.join(app.static_folder, BUILD_DIR, MANIFEST)
+        try:
+            with open(path) as manifest:
+                built = json.load(manifest)
+        except FileNotFoundError:
+            built = {'files': {}, 'variants': {}}
+        state.manifest = built['files']
+        state.variants = {name: set(encodings) for name, encodings in built['variants'].items()}
+
+    def send_static(self, filename):
+        state = self._state
+        variants = state.variants.get(filename)
+        if variants is None:
+            return current_app.send_static_file(filename)
+
+        # A fingerprinted file; pick the smallest encoding the client takes.
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for suffix, encoding in ENCODINGS:
+            if encoding in variants and encoding in request.accept_encodings:
+                break
+        else:
+            suffix = encoding = None
+        response = send_from_directory(current_app.static_folder, filename + (suffix or ''),
+                                       mimetype=mimetype, max_age=current_app.config['ASSETS_MAX_AGE'])
+        response.cache_control.immutable = True
+        if encoding:
+            response.content_encoding = encoding
+        if variants:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+def build(static_folder):
+    # Writes the hashed copies and their compressed variants to static/build
+    # and returns the manifest. Reruns start from a clean directory so stale
+    # hashes do not pile up.
+    target = os.path.join(static_folder, BUILD_DIR)
+    shutil.rmtree(target, ignore_errors=True)
+    files, variants = {}, {}
+    for root, dirs, names in os.walk(static_folder):
+        dirs[:] = sorted(name for name in dirs if os.path.join(root, name) != target)
+        for name in sorted(names):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                content = f.read()
+            stem, extension = os.path.splitext(relative)
+            hashed = f'{BUILD_DIR}/{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+            destination = os.path.join(static_folder, hashed)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            with open(destination, 'wb') as f:
+                f.write(content)
+
+            encodings = []
+            if extension in COMPRESSIBLE:
+                compressed = {'gzip': gzip.compress(content, 9, mtime=0)}
+                if brotli is not None:
+                    compressed['br'] = brotli.compress(content, quality=11)
+                for suffix, encoding in ENCODINGS:
+                    data = compressed.get(encoding)
+                    # Only worth serving when it is actually smaller.
+                    if data is not None and len(data) < len(content):
+                        with open(destination + suffix, 'wb') as f:
+                            f.write(data)
+                        encodings.append(encoding)
+            files[relative] = hashed
+            variants[hashed] = encodings
+
+    manifest = {'files': files, 'variants': variants}
+    with open(os.path.join(target, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+assets_cli = AppGroup('assets', help='Build fingerprinted static files and compiled templates.')
+
+
+@assets_cli.command('build')
+def build_command():
+    manifest = build(current_app.static_folder)
+    for name, hashed in sorted(manifest['files'].items()):
+        encodings = ', '.join(manifest['variants'][hashed]) or 'uncompressed'
+        click.echo(f'{name} -> {hashed} ({encodings})')
+    if brotli is None:
+        click.echo('brotli is not installed; only gzip variants were written.')
+    if current_app.config['TEMPLATE_BYTECODE_CACHE']:
+        # Loading a template compiles it into the bytecode cache.
+        names = current_app.jinja_env.list_templates()
+        for name in names:
+            current_app.jinja_env.get_template(name)
+        click.echo(f'Compiled {len(names)} template(s).')
+
+
+@assets_cli.command('clean')
+def clean_command():
+    shutil.rmtree(os.path.join(current_app.static_folder, BUILD_DIR), ignore_errors=True)
+    click.echo('Removed the built assets; static files are served unhashed.')
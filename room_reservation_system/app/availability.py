@@ -0,0 +1,265 @@
+import threading
+import time as clock
+from bisect import bisect_left, bisect_right
+from datetime import date, time
+
+from flask import current_app
+
+from app import db
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    return time(*divmod(minutes, 60))
+
+
+def slot_of(start):
+    return to_minutes(start) // SLOT_MINUTES
+
+
+def slot_time(slot):
+    return from_minutes(slot * SLOT_MINUTES)
+
+
+def span_mask(start, end):
+    first = start // SLOT_MINUTES
+    last = (end - 1) // SLOT_MINUTES
+    return ((1 << (last + 1)) - 1) ^ ((1 << first) - 1)
+
+
+def occupancy_grid(room_ids, first_day, last_day):
+    # Boolean rooms x days x slots array of occupied slots, filled from one
+    # range query. Each reservation adds +1 at its first slot and -1 after its
+    # last; a cumulative sum along the slot axis turns that into coverage.
+    # numpy is imported on first use, which keeps it out of worker startup.
+    import numpy as np
+
+    from app.models import Reservation
+
+    days = (last_day - first_day).days + 1
+    position = {room_id: i for i, room_id in enumerate(room_ids)}
+    rows = db.session.execute(
+        db.select(Reservation.room_id, Reservation.date, Reservation.time, Reservation.end_time)
+        .where(
+            Reservation.canceled == False,
+            Reservation.room_id.in_(room_ids),
+            Reservation.date.between(first_day, last_day),
+        )
+    ).all()
+
+    coverage = np.zeros((len(room_ids), days, SLOTS_PER_DAY + 1), dtype=np.int32)
+    if rows:
+        rooms, dates, starts, ends = zip(*rows)
+        r = np.fromiter((position[room_id] for room_id in rooms), dtype=np.intp, count=len(rows))
+        d = np.fromiter(((day - first_day).days for day in dates), dtype=np.intp, count=len(rows))
+        s = np.fromiter((to_minutes(start) // SLOT_MINUTES for start in starts), dtype=np.intp, count=len(rows))
+        e = np.fromiter((-(-to_minutes(end) // SLOT_MINUTES) for end in ends), dtype=np.intp, count=len(rows))
+        np.add.at(coverage, (r, d, s), 1)
+        np.add.at(coverage, (r, d, e), -1)
+    return np.cumsum(coverage, axis=2)[:, :, :SLOTS_PER_DAY] > 0
+
+
+def free_windows(grid, min_slots=1):
+    # Runs of free slots as (room index, day index, first slot, end slot)
+    # arrays. Padding each row with occupied slots makes every run open with
+    # a +1 and close with a -1 step, and np.nonzero walks both in the same
+    # order so the k-th start pairs with the k-th end.
+    import numpy as np
+
+    free = np.pad(~grid, ((0, 0), (0, 0), (1, 1))).astype(np.int8)
+    steps = np.diff(free, axis=2)
+    rooms, days, starts = np.nonzero(steps == 1)
+    ends = np.nonzero(steps == -1)[2]
+    keep = ends - starts >= min_slots
+    return rooms[keep], days[keep], starts[keep], ends[keep]
+
+
+# Booked intervals of one room on one day, in minutes since midnight.
+#
+# Live reservations never overlap (reserve() refuses overlapping inserts), so
+# keeping them sorted by start is enough for an interval tree's O(log n)
+# overlap query: only the last interval starting before `end` can reach past
+# `start`.
+class IntervalSet:
+    __slots__ = ('starts', 'ends', 'bitmap')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.bitmap = 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end):
+        i = bisect_left(self.starts, end) - 1
+        return i >= 0 and self.ends[i] > start
+
+    def add(self, start, end):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.bitmap |= span_mask(start, end)
+
+    def remove(self, start, end):
+        i = bisect_left(self.starts, start)
+        while i < len(self.starts) and self.starts[i] == start:
+            if self.ends[i] == end:
+                del self.starts[i]
+                del self.ends[i]
+                break
+            i += 1
+        self.bitmap = 0
+        for s, e in zip(self.starts, self.ends):
+            self.bitmap |= span_mask(s, e)
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.loaded_at = 0.0
+        self.loaded_from = None  # first day read by load(); earlier ones are read on demand
+        # (room_id, date) -> IntervalSet of live reservations
+        self.days = {}
+        # (room_id, date) -> monotonic time the day was last read from the DB
+        self.stamps = {}
+
+
+# Per-process index of booked time keyed by (room, date): sorted intervals for
+# overlap checks plus a bitmap of occupied 15-minute slots for listings.
+#
+# The reservation table is read once, then kept current by occupy()/release()
+# from the commit points in the routes. Writes made by other workers are
+# picked up by re-reading a single (room, date) once it is older than
+# AVAILABILITY_TTL seconds (None trusts the local copy forever), so a day can
+# look busier or freer than it is for that long. The database stays the
+# arbiter for bookings: reserve() never refuses one on this index's word, and
+# it only answers reads such as free-slot listings.
+class Availability:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AVAILABILITY_TTL', 60)
+        app.extensions['availability'] = _State()
+
+    @property
+    def _state(self):
+        return current_app.extensions['availability']
+
+    def load(self):
+        # Reads every live reservation from today on, once per process. The
+        # first requests of a worker often arrive together; they wait here for
+        # the one that got the lock instead of each scanning the table. Past
+        # days can no longer be booked and are read only if something asks.
+        from app.models import Reservation
+
+        state = self._state
+        with state.lock:
+            if state.loaded:
+                return
+            today = date.today()
+            rows = (
+                db.session.query(
+                    Reservation.room_id, Reservation.date,
+                    Reservation.time, Reservation.end_time,
+                )
+                .filter(Reservation.canceled == False, Reservation.date >= today)
+                .execution_options(yield_per=10000)
+            )
+            days = {}
+            for room_id, day, start, end in rows:
+                key = (room_id, day)
+                if key not in days:
+                    days[key] = IntervalSet()
+                days[key].add(to_minutes(start), to_minutes(end))
+
+            now = clock.monotonic()
+            state.days = days
+            state.stamps = dict.fromkeys(days, now)
+            state.loaded_from = today
+            state.loaded_at = now
+            state.loaded = True
+
+    def _refresh(self, room_id, day):
+        from app.models import Reservation
+
+        rows = (
+            db.session.query(Reservation.time, Reservation.end_time)
+            .filter(
+                Reservation.room_id == room_id,
+                Reservation.date == day,
+                Reservation.canceled == False,
+            )
+            .all()
+        )
+        intervals = IntervalSet()
+        for start, end in rows:
+            intervals.add(to_minutes(start), to_minutes(end))
+
+        state = self._state
+        with state.lock:
+            state.days[(room_id, day)] = intervals
+            state.stamps[(room_id, day)] = clock.monotonic()
+        return intervals
+
+    def _day(self, room_id, day):
+        state = self._state
+        if not state.loaded:
+            self.load()
+        ttl = current_app.config['AVAILABILITY_TTL']
+        key = (room_id, day)
+        stamp = state.stamps.get(key)
+        if stamp is None:
+            if day < state.loaded_from:
+                return self._refresh(room_id, day)
+            stamp = state.loaded_at
+        if ttl is not None and clock.monotonic() - stamp > ttl:
+            return self._refresh(room_id, day)
+        return state.days.get(key) or IntervalSet()
+
+    def occupy(self, room_id, day, start, end):
+        state = self._state
+        if not state.loaded:
+            return
+        key = (room_id, day)
+        with state.lock:
+            if key not in state.days:
+                state.days[key] = IntervalSet()
+            state.days[key].add(to_minutes(start), to_minutes(end))
+
+    def release(self, room_id, day, start, end):
+        state = self._state
+        if not state.loaded:
+            return
+        key = (room_id, day)
+        with state.lock:
+            intervals = state.days.get(key)
+            if intervals is not None:
+                intervals.remove(to_minutes(start), to_minutes(end))
+                if not intervals:
+                    del state.days[key]
+
+    def overlaps(self, room_id, day, start, end):
+        return self._day(room_id, day).overlaps(to_minutes(start), to_minutes(end))
+
+    def is_free(self, room_id, day, start):
+        return not self._day(room_id, day).bitmap & (1 << slot_of(start))
+
+    def free_slots(self, room_id, day):
+        free = ~self._day(room_id, day).bitmap & FULL_DAY
+        slots = []
+        while free:
+            low = free & -free
+            slots.append(slot_time(low.bit_length() - 1))
+            free ^= low
+        return slots
@@ -0,0 +1,101 @@
+import threading
+import time as clock
+from collections import namedtuple
+from itertools import chain
+
+from flask import current_app, has_app_context
+
+from app import db
+
+RoomEntry = namedtuple('RoomEntry', ['id', 'name'])
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (by_name, by_id), replaced as a whole so a reader that took it is
+        # never affected by a concurrent reload or invalidate().
+        self.rooms = None
+        self.loaded_at = 0.0
+
+
+# Process-level copy of the room table, so form choices and room lookups on
+# the booking path never touch the database. Room changes committed through
+# the ORM invalidate it; changes made by other workers or scripts are picked
+# up after ROOM_CATALOG_TTL seconds (None keeps the copy until invalidated).
+class RoomCatalog:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ROOM_CATALOG_TTL', 300)
+        app.extensions['room_catalog'] = _State()
+
+    @property
+    def _state(self):
+        return current_app.extensions['room_catalog']
+
+    def _load(self):
+        from app.models import Room
+
+        rooms = [RoomEntry(room.id, room.name) for room in db.session.execute(
+            db.select(Room.id, Room.name).order_by(Room.name)
+        )]
+        snapshot = ({room.name: room for room in rooms}, {room.id: room for room in rooms})
+        state = self._state
+        with state.lock:
+            state.rooms = snapshot
+            state.loaded_at = clock.monotonic()
+        return snapshot
+
+    def _fresh(self):
+        # Returns the (by_name, by_id) snapshot, reloading it if needed.
+        state = self._state
+        ttl = current_app.config['ROOM_CATALOG_TTL']
+        with state.lock:
+            rooms, loaded_at = state.rooms, state.loaded_at
+        if rooms is None or (ttl is not None and clock.monotonic() - loaded_at > ttl):
+            rooms = self._load()
+        return rooms
+
+    def invalidate(self):
+        state = self._state
+        with state.lock:
+            state.rooms = None
+
+    def get(self, name):
+        by_name, _ = self._fresh()
+        return by_name.get(name)
+
+    def get_by_id(self, room_id):
+        _, by_id = self._fresh()
+        return by_id.get(room_id)
+
+    def all(self):
+        by_name, _ = self._fresh()
+        return list(by_name.values())
+
+    def choices(self):
+        return [(room.name, room.name) for room in self.all()]
+
+
+@db.event.listens_for(db.session, 'after_flush')
+def _note_room_changes(session, flush_context):
+    from app.models import Room
+
+    if any(isinstance(obj, Room) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info['rooms_changed'] = True
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('rooms_changed', False) and has_app_context():
+        from app import room_catalog
+
+        room_catalog.invalidate()
+
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _forget_room_changes(session):
+    session.info.pop('rooms_changed', None)
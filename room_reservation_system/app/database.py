@@ -0,0 +1,53 @@
+import os
+
+from sqlalchemy import event
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+
+
+# The schema is managed by the Alembic migrations in migrations/; the app
+# never creates tables itself.
+def init_migrations(app):
+    from flask_migrate import Migrate
+
+    from app import db
+
+    if 'migrate' not in app.extensions:
+        Migrate(app, db, directory=MIGRATIONS)
+
+
+def upgrade_schema(app):
+    from flask_migrate import upgrade
+
+    init_migrations(app)
+    with app.app_context():
+        upgrade()
+
+
+def reset_schema(app):
+    # Builds the current schema straight from the models and marks it as the
+    # latest revision, which is quicker than replaying every migration and
+    # ends up the same.
+    from flask_migrate import stamp
+
+    from app import db
+
+    init_migrations(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        stamp()
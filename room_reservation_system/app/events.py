@@ -0,0 +1,275 @@
+import json
+import queue
+import threading
+import time as clock
+from datetime import datetime, timedelta
+from itertools import count
+
+from flask import current_app, has_app_context
+from werkzeug.utils import import_string
+
+from app import db
+
+SLOT_TAKEN = 'slot-taken'
+SLOT_FREED = 'slot-freed'
+
+
+# Raised by subscribe() when EVENTS_MAX_SUBSCRIBERS streams are already open
+# in this process; answered with a 503 and Retry-After.
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, room_ids, first_day, last_day, size):
+        self.room_ids = room_ids
+        self.first_day = first_day.isoformat()
+        self.last_day = last_day.isoformat()
+        self.queue = queue.Queue(size)
+        # Set when events had to be dropped because the client fell behind;
+        # it is told to reload instead of being sent an incomplete stream.
+        self.overflowed = False
+
+    def matches(self, event):
+        return ((self.room_ids is None or event['room_id'] in self.room_ids)
+                and self.first_day <= event['date'] <= self.last_day)
+
+    def offer(self, event_id, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait((event_id, event))
+        except queue.Full:
+            self.overflowed = True
+
+
+# Delivers to subscribers of this process only; enough for one worker
+# process, or for tests.
+class LocalBackend:
+    def __init__(self, app, deliver):
+        self.deliver = deliver
+        self.ids = count(1)
+
+    def publish(self, events):
+        self.deliver([(next(self.ids), event) for event in events])
+
+    def start(self):
+        pass
+
+
+# Shares events between worker processes through the availability_event
+# table: publishing inserts rows, and one thread per process polls for rows it
+# has not seen every EVENTS_POLL_INTERVAL seconds. Rows older than
+# EVENTS_RETENTION seconds are deleted as new ones come in.
+#
+# Ids are not assigned in commit order on PostgreSQL, so a row can become
+# visible after rows with higher ids were already delivered. Each poll
+# therefore also re-reads the rows created in the last EVENTS_POLL_LOOKBACK
+# seconds and skips the ids it has delivered; only an event whose commit
+# lagged its insert by more than that (or clocks skewed by more than that
+# between workers) can still be missed. The table holds a retention window
+# of rows at most, so re-reading them is cheap.
+class DatabaseBackend:
+    def __init__(self, app, deliver):
+        self.app = app
+        self.deliver = deliver
+        self.lock = threading.Lock()
+        self.thread = None
+        self.purged_at = 0.0
+
+    def publish(self, events):
+        from app.models import AvailabilityEvent
+
+        table = AvailabilityEvent.__table__
+        now = datetime.utcnow()
+        retention = self.app.config['EVENTS_RETENTION']
+        with db.engine.begin() as connection:
+            connection.execute(table.insert(), [
+                {'created_at': now, 'payload': json.dumps(event)} for event in events
+            ])
+            if clock.monotonic() - self.purged_at > retention:
+                self.purged_at = clock.monotonic()
+                connection.execute(table.delete().where(table.c.created_at < now - timedelta(seconds=retention)))
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._poll, name='events-poll', daemon=True)
+                self.thread.start()
+
+    def _poll(self):
+        from app.models import AvailabilityEvent
+
+        table = AvailabilityEvent.__table__
+        lookback = timedelta(seconds=self.app.config['EVENTS_POLL_LOOKBACK'])
+        with self.app.app_context():
+            # id -> created_at of the rows inside the lookback window that
+            # were already delivered (or existed before this process).
+            seen = dict(db.session.execute(
+                db.select(table.c.id, table.c.created_at).where(table.c.created_at >= datetime.utcnow() - lookback)
+            ).all())
+            last_id = db.session.scalar(db.select(db.func.max(table.c.id))) or 0
+            db.session.remove()
+            while True:
+                clock.sleep(self.app.config['EVENTS_POLL_INTERVAL'])
+                since = datetime.utcnow() - lookback
+                try:
+                    rows = db.session.execute(
+                        db.select(table.c.id, table.c.created_at, table.c.payload)
+                        .where(db.or_(table.c.id > last_id, table.c.created_at >= since))
+                        .order_by(table.c.id)
+                    ).all()
+                except Exception:
+                    current_app.logger.exception('Polling availability events failed')
+                    rows = []
+                finally:
+                    db.session.remove()
+                seen = {event_id: created for event_id, created in seen.items() if created >= since}
+                rows = [row for row in rows if row.id not in seen]
+                if rows:
+                    seen.update((row.id, row.created_at) for row in rows)
+                    last_id = max(last_id, rows[-1].id)
+                    self.deliver([(row.id, json.loads(row.payload)) for row in rows])
+
+
+BACKENDS = {'local': LocalBackend, 'database': DatabaseBackend}
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+        self.backend = None
+
+
+# Fans slot-taken / slot-freed events out to the clients streaming /events.
+# Views call taken()/freed() before committing; the events are published
+# after the commit succeeds and dropped on rollback, so clients never hear of
+# a booking that did not happen. EVENTS_BACKEND picks how events reach other
+# worker processes: 'local' (this process only), 'database', or the import
+# path of a class with the same interface.
+#
+# Each open stream holds a worker thread (or greenlet) for up to
+# EVENTS_MAX_STREAM seconds, and it is no longer counted by the rate
+# limiter's in-flight limit, because the body is sent after the request's
+# teardown. Serve /events from a threaded worker (gunicorn -k gthread with
+# more --threads than EVENTS_MAX_SUBSCRIBERS) or gevent, never from sync
+# workers. A process accepts at most EVENTS_MAX_SUBSCRIBERS streams at once,
+# so open tabs cannot take every thread; further ones get a 503 and retry
+# after EVENTS_RETRY_AFTER seconds.
+class EventBroker:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EVENTS_BACKEND', 'local')
+        app.config.setdefault('EVENTS_QUEUE_SIZE', 256)
+        app.config.setdefault('EVENTS_HEARTBEAT', 15)
+        app.config.setdefault('EVENTS_MAX_STREAM', 300)
+        app.config.setdefault('EVENTS_MAX_SUBSCRIBERS', 16)
+        app.config.setdefault('EVENTS_RETRY_AFTER', 30)
+        app.config.setdefault('EVENTS_POLL_INTERVAL', 0.5)
+        app.config.setdefault('EVENTS_POLL_LOOKBACK', 5)
+        app.config.setdefault('EVENTS_RETENTION', 60)
+        state = app.extensions['events'] = _State()
+        backend = app.config['EVENTS_BACKEND']
+        if isinstance(backend, str):
+            backend = BACKENDS.get(backend) or import_string(backend)
+        state.backend = backend(app, lambda events: self._deliver(state, events))
+
+    @property
+    def _state(self):
+        return current_app.extensions['events']
+
+    def _record(self, kind, room_id, room_name, day, start, end):
+        db.session.info.setdefault('events', []).append({
+            'type': kind,
+            'room_id': room_id,
+            'room': room_name,
+            'date': day.isoformat(),
+            'start': start.strftime('%H:%M'),
+            'end': end.strftime('%H:%M'),
+        })
+
+    def taken(self, room_id, room_name, day, start, end):
+        self._record(SLOT_TAKEN, room_id, room_name, day, start, end)
+
+    def freed(self, room_id, room_name, day, start, end):
+        self._record(SLOT_FREED, room_id, room_name, day, start, end)
+
+    def publish(self, events):
+        try:
+            self._state.backend.publish(events)
+        except Exception:
+            # The booking is already committed; a lost event only means a
+            # client refreshes late.
+            current_app.logger.exception('Publishing %d availability event(s) failed', len(events))
+
+    def _deliver(self, state, events):
+        with state.lock:
+            subscriptions = list(state.subscriptions)
+        for subscription in subscriptions:
+            for event_id, event in events:
+                if subscription.matches(event):
+                    subscription.offer(event_id, event)
+
+    def subscribe(self, room_ids, first_day, last_day):
+        state = self._state
+        config = current_app.config
+        subscription = Subscription(room_ids, first_day, last_day, config['EVENTS_QUEUE_SIZE'])
+        with state.lock:
+            limit = config['EVENTS_MAX_SUBSCRIBERS']
+            if limit is not None and len(state.subscriptions) >= limit:
+                raise TooManySubscribers()
+            state.subscriptions.add(subscription)
+        state.backend.start()
+        return subscription
+
+    def subscribers(self):
+        return len(self._state.subscriptions)
+
+    def stream(self, subscription):
+        # Server-sent events for one subscription. Runs after the request
+        # context is gone, so it only touches the subscription's queue. A
+        # comment line every EVENTS_HEARTBEAT seconds keeps proxies from
+        # closing the connection and notices clients that went away; after
+        # EVENTS_MAX_STREAM seconds the stream ends and the browser reconnects,
+        # which spreads long-lived connections over the workers.
+        config = current_app.config
+        heartbeat, max_stream = config['EVENTS_HEARTBEAT'], config['EVENTS_MAX_STREAM']
+        state = self._state
+
+        def generate():
+            deadline = clock.monotonic() + max_stream
+            try:
+                yield 'retry: 2000\n: connected\n\n'
+                while clock.monotonic() < deadline:
+                    if subscription.overflowed:
+                        yield 'event: reset\ndata: {}\n\n'
+                        return
+                    try:
+                        event_id, event = subscription.queue.get(timeout=heartbeat)
+                    except queue.Empty:
+                        yield ': keep-alive\n\n'
+                        continue
+                    yield f'id: {event_id}\nevent: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+            finally:
+                with state.lock:
+                    state.subscriptions.discard(subscription)
+
+        return generate()
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def _publish_on_commit(session):
+    events = session.info.pop('events', None)
+    if events and has_app_context():
+        from app import events as broker
+
+        broker.publish(events)
+
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _forget_events(session):
+    session.info.pop('events', None)
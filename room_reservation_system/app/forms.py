@@ -1,6 +1,8 @@
+from flask import current_app
 from flask_wtf import FlaskForm
 from wtforms import BooleanField, StringField, PasswordField, SubmitField, SelectField, DateField, TimeField
-from wtforms.validators import DataRequired, Email, Length, EqualTo
+from wtforms.validators import DataRequired, Email, Length, EqualTo, Optional, ValidationError
+from app import room_catalog
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -17,12 +19,48 @@ class RegistrationForm(FlaskForm):
     confirm_password = PasswordField('Confirm Password', validators=[DataRequired(), EqualTo('password')])
     submit = SubmitField('Register')
 
+class ProfileForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired(), Length(min=4, max=20)])
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    phone = StringField('Phone', validators=[DataRequired()])
+    password = PasswordField('New Password', validators=[Optional()])
+    confirm_password = PasswordField('Confirm New Password', validators=[EqualTo('password')])
+    submit = SubmitField('Save Changes')
+
 class ResetPasswordForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
     submit = SubmitField('Reset Password')
 
 class ReservationForm(FlaskForm):
-    room = SelectField('Room', choices=[('Room 1', 'Room 1'), ('Room 2', 'Room 2'), ('Room 3', 'Room 3')], validators=[DataRequired()])
+    room = SelectField('Room', validators=[DataRequired()])
     date = DateField('Date', format='%Y-%m-%d', validators=[DataRequired()])
     time = TimeField('Time', format='%H:%M', validators=[DataRequired()])
+    duration = SelectField('Duration', coerce=int, default=15, choices=[
+        (15, '15 minutes'), (30, '30 minutes'), (45, '45 minutes'), (60, '1 hour'),
+        (90, '1 hour 30 minutes'), (120, '2 hours'), (180, '3 hours'), (240, '4 hours'),
+    ])
+    waitlist = BooleanField('If taken, join the waitlist')
     submit = SubmitField('Reserve')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.room.choices = room_catalog.choices()
+
+    def validate_duration(self, field):
+        if self.time.data and self.time.data.hour * 60 + self.time.data.minute + field.data >= 24 * 60:
+            raise ValidationError('Reservations must end before midnight.')
+
+class RecurringReservationForm(ReservationForm):
+    until = DateField('Until', format='%Y-%m-%d', validators=[DataRequired()])
+    every = SelectField('Repeat', coerce=int, default=7, choices=[
+        (1, 'Every day'), (7, 'Every week'), (14, 'Every two weeks'),
+    ])
+    submit = SubmitField('Reserve series')
+
+    def validate_until(self, field):
+        if self.date.data and field.data < self.date.data:
+            raise ValidationError('The series must end on or after its first date.')
+        if self.date.data and self.every.data:
+            cap = current_app.config['RECURRING_MAX_OCCURRENCES']
+            if (field.data - self.date.data).days // self.every.data + 1 > cap:
+                raise ValidationError(f'A series can have at most {cap} reservations; choose an earlier end date.')
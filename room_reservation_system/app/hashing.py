@@ -0,0 +1,88 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class _State:
+    def __init__(self, workers, max_pending):
+        self.lock = threading.Lock()
+        self.pool = None
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(max_pending)
+
+
+# Password hashing with a configurable scheme and cost.
+#
+# PBKDF2/scrypt are CPU-bound, so with PASSWORD_HASH_WORKERS > 0 they run in a
+# process pool instead of on the request thread, and at most
+# PASSWORD_HASH_MAX_PENDING hashes may be queued or running at once. A request
+# that cannot get a slot within PASSWORD_HASH_QUEUE_TIMEOUT seconds gets
+# HasherBusy rather than piling onto an overloaded pool.
+#
+# PASSWORD_HASH_METHOD must be written out in full (e.g.
+# 'pbkdf2:sha256:600000' or 'scrypt:32768:8:1') because needs_rehash()
+# compares it with the prefix stored in each hash.
+class PasswordHasher:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 0)
+        app.config.setdefault('PASSWORD_HASH_MAX_PENDING', 32)
+        app.config.setdefault('PASSWORD_HASH_QUEUE_TIMEOUT', 5)
+        app.extensions['password_hasher'] = _State(
+            app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_MAX_PENDING']
+        )
+
+    @property
+    def _state(self):
+        return current_app.extensions['password_hasher']
+
+    def _pool(self, state):
+        with state.lock:
+            if state.pool is None:
+                # Spawned, not forked: the web server's threads and locks must
+                # not be copied into the workers.
+                state.pool = ProcessPoolExecutor(
+                    max_workers=state.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+                atexit.register(state.pool.shutdown, wait=False, cancel_futures=True)
+            return state.pool
+
+    def _run(self, fn, *args):
+        state = self._state
+        if not state.workers:
+            return fn(*args)
+        if not state.slots.acquire(timeout=current_app.config['PASSWORD_HASH_QUEUE_TIMEOUT']):
+            raise HasherBusy()
+        try:
+            return self._pool(state).submit(fn, *args).result()
+        finally:
+            state.slots.release()
+
+    def hash(self, password):
+        return self._run(
+            generate_password_hash, password,
+            current_app.config['PASSWORD_HASH_METHOD'],
+            current_app.config['PASSWORD_SALT_LENGTH'],
+        )
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != current_app.config['PASSWORD_HASH_METHOD']
@@ -0,0 +1,138 @@
+import threading
+import time as clock
+from collections import OrderedDict
+from itertools import chain
+
+from flask import current_app, has_app_context, session
+from sqlalchemy.orm import make_transient_to_detached
+
+from app import db
+
+SESSION_KEY = '_user_version'
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # user_id -> (column values, version, expires_at), least recent first
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+# Bounded LRU/TTL cache of User rows for the Flask-Login user_loader, so an
+# authenticated page view does not start with a SELECT on the user table.
+#
+# Entries hold plain column values; a hit rebuilds a User and merges it into
+# the request's session without loading, so current_user can still be edited
+# and committed. Users changed through the ORM are dropped on commit, but
+# only in this process: the session carries the version the user last saw,
+# which catches their own changes made in another worker, and anything else
+# changed elsewhere (a new email, say) can be served stale for up to
+# IDENTITY_CACHE_TTL seconds. Privileges cannot wait that long, so a cached
+# admin is confirmed with a primary key lookup of the row's version on every
+# request and reloaded if it moved.
+class IdentityCache:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IDENTITY_CACHE_SIZE', 1024)
+        app.config.setdefault('IDENTITY_CACHE_TTL', 60)
+        app.extensions['identity_cache'] = _State()
+
+    @property
+    def _state(self):
+        return current_app.extensions['identity_cache']
+
+    def _get(self, user_id):
+        state = self._state
+        with state.lock:
+            entry = state.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[2] < clock.monotonic():
+                del state.entries[user_id]
+                return None
+            state.entries.move_to_end(user_id)
+            return entry
+
+    def _put(self, user):
+        state = self._state
+        values = {attr.key: getattr(user, attr.key) for attr in db.inspect(user).mapper.column_attrs}
+        expires = clock.monotonic() + current_app.config['IDENTITY_CACHE_TTL']
+        with state.lock:
+            state.entries[user.id] = (values, user.version, expires)
+            state.entries.move_to_end(user.id)
+            while len(state.entries) > current_app.config['IDENTITY_CACHE_SIZE']:
+                state.entries.popitem(last=False)
+                state.evictions += 1
+
+    def load(self, user_id):
+        from app.models import User
+
+        state = self._state
+        entry = self._get(user_id)
+        seen = session.get(SESSION_KEY)
+        hit = entry is not None and (seen is None or entry[1] >= seen)
+        if hit and entry[0]['is_admin']:
+            hit = db.session.scalar(db.select(User.version).where(User.id == user_id)) == entry[1]
+        with state.lock:
+            if hit:
+                state.hits += 1
+            else:
+                state.misses += 1
+        if hit:
+            user = User(**entry[0])
+            make_transient_to_detached(user)
+            user = db.session.merge(user, load=False)
+        else:
+            user = db.session.get(User, user_id)
+            if user is None:
+                return None
+            self._put(user)
+        if seen != user.version:
+            session[SESSION_KEY] = user.version
+        return user
+
+    def invalidate(self, user_ids):
+        state = self._state
+        with state.lock:
+            for user_id in user_ids:
+                state.entries.pop(user_id, None)
+
+    def stats(self):
+        state = self._state
+        lookups = state.hits + state.misses
+        return {
+            'size': len(state.entries),
+            'hits': state.hits,
+            'misses': state.misses,
+            'evictions': state.evictions,
+            'hit_rate': state.hits / lookups if lookups else 0.0,
+        }
+
+
+@db.event.listens_for(db.session, 'after_flush')
+def _note_user_changes(session, flush_context):
+    from app.models import User
+
+    changed = {obj.id for obj in chain(session.dirty, session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('users_changed', set()).update(changed)
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def _invalidate_on_commit(session):
+    changed = session.info.pop('users_changed', None)
+    if changed and has_app_context():
+        from app import identity_cache
+
+        identity_cache.invalidate(changed)
+
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _forget_user_changes(session):
+    session.info.pop('users_changed', None)
@@ -0,0 +1,268 @@
+import json
+import random
+import threading
+import time as clock
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+
+from app import db
+
+_handlers = {}
+
+
+def task(kind):
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+class _State:
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.threads = []
+
+
+# Persistent background jobs for slow side effects such as sending email.
+#
+# enqueue() adds a Job row to the current session, so a job is committed (or
+# rolled back) together with the change that caused it, and the request
+# returns without waiting for it. JOBS_WORKERS threads per process, started
+# on the first enqueue, pick jobs up; `flask jobs work` runs dedicated worker
+# processes instead (set JOBS_WORKERS=0 in the web processes then). Workers
+# claim a job with a conditional UPDATE, so any number of them may share the
+# table. A failing job is retried with exponential backoff until it has run
+# JOBS_MAX_ATTEMPTS times; a job left running longer than JOBS_STALE_AFTER
+# seconds (its worker died) is picked up again.
+class JobQueue:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_WORKERS', 1)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOBS_BACKOFF_BASE', 2.0)
+        app.config.setdefault('JOBS_BACKOFF_MAX', 300.0)
+        app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+        app.config.setdefault('JOBS_STALE_AFTER', 300)
+        app.extensions['jobs'] = _State(app)
+        app.cli.add_command(jobs_cli)
+
+    @property
+    def _state(self):
+        return current_app.extensions['jobs']
+
+    def enqueue(self, kind, max_attempts=None, delay=0, **payload):
+        from app.models import Job
+
+        job = Job(
+            kind=kind,
+            payload=json.dumps(payload, default=str),
+            max_attempts=max_attempts or current_app.config['JOBS_MAX_ATTEMPTS'],
+            run_at=datetime.utcnow() + timedelta(seconds=delay),
+        )
+        db.session.add(job)
+        db.session.info['jobs_enqueued'] = True
+        return job
+
+    def start(self, workers=None):
+        state = self._state
+        workers = current_app.config['JOBS_WORKERS'] if workers is None else workers
+        with state.lock:
+            # A worker that died anyway is replaced on the next start(),
+            # which every enqueue triggers.
+            state.threads = [thread for thread in state.threads if thread.is_alive()]
+            if len(state.threads) >= workers:
+                return
+            state.stopping.clear()
+            for i in range(len(state.threads), workers):
+                thread = threading.Thread(target=self._work, args=(state,), name=f'jobs-{i}', daemon=True)
+                thread.start()
+                state.threads.append(thread)
+
+    def stop(self, timeout=None):
+        state = self._state
+        state.stopping.set()
+        state.wakeup.set()
+        with state.lock:
+            threads, state.threads = state.threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def notify(self):
+        self.start()
+        self._state.wakeup.set()
+
+    def _work(self, state):
+        from app import metrics
+
+        errors = 0
+        while not state.stopping.is_set():
+            with state.app.app_context():
+                poll = current_app.config['JOBS_POLL_INTERVAL']
+                try:
+                    ran = self.run_next()
+                    errors = 0
+                except Exception:
+                    # Usually the database is unreachable or locked. Drop the
+                    # session and its connection, and wait longer after each
+                    # failure in a row instead of letting the thread die.
+                    errors += 1
+                    ran = False
+                    poll = self.backoff(errors)
+                    current_app.logger.exception('Job worker error, retrying in %.1fs', poll)
+                    metrics.inc('jobs_worker_errors_total', ())
+                    db.session.remove()
+            if not ran and state.wakeup.wait(poll):
+                state.wakeup.clear()
+
+    def _claim(self):
+        from app.models import Job
+
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=current_app.config['JOBS_STALE_AFTER'])
+        for due in (
+            db.and_(Job.status == 'pending', Job.run_at <= now),
+            db.and_(Job.status == 'running', Job.started_at < stale),
+        ):
+            job_id = db.session.scalar(db.select(Job.id).where(due).order_by(Job.run_at, Job.id).limit(1))
+            if job_id is None:
+                continue
+            claimed = db.session.execute(
+                db.update(Job).where(Job.id == job_id, due)
+                .values(status='running', attempts=Job.attempts + 1, started_at=now)
+            ).rowcount
+            db.session.commit()
+            # Zero rows means another worker claimed it first; try again.
+            return job_id if claimed else False
+        db.session.rollback()
+        return None
+
+    def run_next(self):
+        from app import metrics
+        from app.models import Job
+
+        job_id = self._claim()
+        if not job_id:
+            return job_id is False
+        job = db.session.get(Job, job_id)
+        kind = job.kind
+        started = clock.perf_counter()
+        try:
+            handler = _handlers.get(kind)
+            if handler is None:
+                raise LookupError(f'no handler for job kind {kind!r}')
+            handler(**json.loads(job.payload))
+        except Exception as error:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.last_error = traceback.format_exc()
+            if job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+                outcome = 'failed'
+                current_app.logger.error('Job %s (%s) failed after %d attempts:\n%s',
+                                         job_id, kind, job.attempts, job.last_error)
+            else:
+                delay = self.backoff(job.attempts)
+                job.status = 'pending'
+                job.run_at = datetime.utcnow() + timedelta(seconds=delay)
+                outcome = 'retried'
+                current_app.logger.warning('Job %s (%s) attempt %d failed, retrying in %.1fs: %r',
+                                           job_id, kind, job.attempts, delay, error)
+        else:
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            outcome = 'done'
+        db.session.commit()
+
+        labels = (('kind', kind),)
+        metrics.inc('jobs_total', labels + (('outcome', outcome),))
+        metrics.observe('job_duration_seconds', labels, clock.perf_counter() - started)
+        if outcome == 'done':
+            metrics.observe('job_latency_seconds', labels,
+                            (job.finished_at - job.created_at).total_seconds())
+        return True
+
+    def backoff(self, attempts):
+        delay = min(current_app.config['JOBS_BACKOFF_BASE'] * 2 ** (attempts - 1),
+                    current_app.config['JOBS_BACKOFF_MAX'])
+        return delay * random.uniform(0.8, 1.2)
+
+    def counts(self):
+        from app.models import Job
+
+        # Done jobs are left out so the count stays an index lookup however
+        # many have piled up; `flask jobs purge` clears them.
+        rows = db.session.execute(
+            db.select(Job.status, db.func.count())
+            .where(Job.status.in_(['pending', 'running', 'failed']))
+            .group_by(Job.status)
+        )
+        counts = {'pending': 0, 'running': 0, 'failed': 0}
+        counts.update(dict(rows.all()))
+        return counts
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def _wake_workers_on_commit(session):
+    if session.info.pop('jobs_enqueued', False) and has_app_context():
+        from app import jobs
+
+        jobs.notify()
+
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _forget_enqueued(session):
+    session.info.pop('jobs_enqueued', None)
+
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+
+@jobs_cli.command('work')
+@click.option('--threads', default=1, show_default=True, help='Worker threads in this process.')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+def work_command(threads, burst):
+    from app import jobs
+
+    if burst:
+        while jobs.run_next():
+            pass
+        return
+    jobs.start(threads)
+    click.echo(f'Working with {threads} thread(s); Ctrl-C to stop.')
+    try:
+        while True:
+            clock.sleep(3600)
+    except KeyboardInterrupt:
+        jobs.stop()
+
+
+@jobs_cli.command('purge')
+@click.option('--days', default=7, show_default=True, help='Delete jobs done more than this many days ago.')
+def purge_command(days):
+    from app.models import Job
+
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = db.session.execute(
+        db.delete(Job).where(Job.status == 'done', Job.finished_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    click.echo(f'Deleted {deleted} job(s).')
+
+
+@jobs_cli.command('stats')
+def stats_command():
+    from app import jobs
+
+    for status, count in jobs.counts().items():
+        click.echo(f'{status}: {count}')
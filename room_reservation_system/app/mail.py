@@ -0,0 +1,71 @@
+import smtplib
+from email.message import EmailMessage
+
+from flask import current_app
+
+from app import jobs
+from app.jobs import task
+
+
+# Runs in a job worker. Without MAIL_SERVER (e.g. in development) messages
+# are only logged.
+@task('send_email')
+def send_email(to, subject, body):
+    config = current_app.config
+    message = EmailMessage()
+    message['From'] = config['MAIL_DEFAULT_SENDER']
+    message['To'] = to
+    message['Subject'] = subject
+    message.set_content(body)
+
+    if not config['MAIL_SERVER']:
+        current_app.logger.info('Email to %s not sent, MAIL_SERVER is not set: %s', to, subject)
+        return
+    with smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=config['MAIL_TIMEOUT']) as smtp:
+        if config['MAIL_USE_TLS']:
+            smtp.starttls()
+        if config['MAIL_USERNAME']:
+            smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        smtp.send_message(message)
+
+
+def queue_email(to, subject, body):
+    if to:
+        jobs.enqueue('send_email', to=to, subject=subject, body=body)
+
+
+def _slot(day, start, end):
+    return f'{day:%Y-%m-%d} {start:%H:%M}-{end:%H:%M}'
+
+
+def booking_confirmed(email, room_name, days, start, end):
+    lines = '\n'.join(f'  {_slot(day, start, end)}' for day in sorted(days))
+    queue_email(email, f'Reservation confirmed: {room_name}',
+                f'Your reservation of {room_name} is confirmed:\n\n{lines}\n')
+
+
+def booking_canceled(email, room_name, day, start, end):
+    queue_email(email, f'Reservation canceled: {room_name}',
+                f'Your reservation of {room_name} on {_slot(day, start, end)} '
+                f'was canceled by an administrator.\n')
+
+
+def bookings_canceled(email, bookings):
+    # One message for everything of a user's that a bulk cancel took out.
+    lines = '\n'.join(f'  {room_name}: {_slot(day, start, end)}'
+                      for room_name, day, start, end in sorted(bookings, key=lambda booking: booking[1:]))
+    queue_email(email, f'{len(bookings)} reservation(s) canceled',
+                f'These reservations were canceled by an administrator:\n\n{lines}\n')
+
+
+def waitlist_promoted(email, room_name, day, start, end):
+    queue_email(email, f'Reservation confirmed: {room_name}',
+                f'A slot you were waiting for became free, and it is yours: '
+                f'{room_name} on {_slot(day, start, end)}.\n')
+
+
+def password_reset_requested(email):
+    queue_email(email, 'Password reset request',
+                'A password reset was requested for your account. '
+                'Please contact an administrator to complete it.\n'
+                'If you did not ask for this, you can ignore this message.\n')
@@ -0,0 +1,251 @@
+import contextvars
+import math
+import threading
+import time as clock
+from bisect import bisect_left
+
+from flask import current_app, has_app_context, request
+from sqlalchemy import event
+
+from app import db
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+STATEMENT_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100]
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Stats of the request being served on this thread, read on every statement;
+# a context variable is much cheaper to reach than flask.g.
+_current = contextvars.ContextVar('metrics_request', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Family:
+    def __init__(self, name, kind, help_text):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.series = {}
+
+    def header(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} {self.kind}'
+
+
+class _Counter(_Family):
+    def __init__(self, name, help_text):
+        super().__init__(name, 'counter', help_text)
+
+    def inc(self, labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self):
+        yield from self.header()
+        for labels, value in sorted(self.series.items()):
+            yield f'{self.name}{_labels(labels)} {_number(value)}'
+
+
+class _Gauge(_Counter):
+    def __init__(self, name, help_text):
+        _Family.__init__(self, name, 'gauge', help_text)
+
+    def set(self, labels, value):
+        self.series[labels] = value
+
+
+class _Histogram(_Family):
+    def __init__(self, name, help_text, buckets):
+        super().__init__(name, 'histogram', help_text)
+        self.buckets = list(buckets)
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            # Per-bucket counts (the last one is +Inf), sum, count.
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        yield from self.header()
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + [math.inf], counts):
+                cumulative += n
+                yield f'{self.name}_bucket{_labels(labels + (("le", _number(bound)),))} {cumulative}'
+            yield f'{self.name}_sum{_labels(labels)} {_number(total)}'
+            yield f'{self.name}_count{_labels(labels)} {count}'
+
+
+class _RequestStats:
+    __slots__ = ('started', 'statements', 'sql_time', 'statement_started', 'log', 'log_limit', 'token')
+
+    def __init__(self, log_limit):
+        self.started = clock.perf_counter()
+        self.statements = 0
+        self.sql_time = 0.0
+        self.statement_started = 0.0
+        self.log = [] if log_limit else None
+        self.log_limit = log_limit
+        self.token = None
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.families = {}
+
+
+# In-process metrics for the main blueprint, exposed in the Prometheus text
+# format. Each request records its latency and how many SQL statements it ran
+# and for how long (via cursor-execute events on the engine). With
+# SLOW_REQUEST_THRESHOLD set (seconds), requests slower than that are logged
+# together with their statements. Every worker process keeps its own
+# registry, so scrape each worker or aggregate them in Prometheus. With
+# METRICS_TOKEN set, /metrics only answers requests carrying it as a bearer
+# token; anyone else gets a 404.
+class Metrics:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', False)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('SLOW_REQUEST_THRESHOLD', None)
+        app.config.setdefault('SLOW_REQUEST_MAX_STATEMENTS', 50)
+        state = app.extensions['metrics'] = _State()
+        self._family(state, _Histogram(
+            'http_request_duration_seconds', 'Request latency by endpoint.', LATENCY_BUCKETS))
+        self._family(state, _Counter(
+            'http_requests_total', 'Requests by endpoint, method and status.'))
+        self._family(state, _Histogram(
+            'db_statements_per_request', 'SQL statements executed per request.', STATEMENT_BUCKETS))
+        self._family(state, _Histogram(
+            'db_time_per_request_seconds', 'Time spent in SQL per request.', LATENCY_BUCKETS))
+        self._family(state, _Counter(
+            'db_statements_total', 'SQL statements executed, in and out of requests.'))
+        self._family(state, _Counter(
+            'http_slow_requests_total', 'Requests slower than SLOW_REQUEST_THRESHOLD.'))
+        self._family(state, _Counter(
+            'ratelimit_limited_total', 'Requests refused with 429 by endpoint and bucket scope.'))
+        self._family(state, _Counter(
+            'ratelimit_shed_total', 'Requests refused with 503 under overload, by reason.'))
+        self._family(state, _Counter(
+            'ratelimit_backend_errors_total', 'Rate limiter backend failures (requests let through).'))
+        self._family(state, _Histogram(
+            'http_queue_seconds', 'Time requests waited before a worker took them (X-Request-Start).',
+            LATENCY_BUCKETS))
+        self._family(state, _Counter(
+            'jobs_total', 'Background job runs by kind and outcome.'))
+        self._family(state, _Counter(
+            'jobs_worker_errors_total', 'Job worker loop failures (the worker backs off and retries).'))
+        self._family(state, _Histogram(
+            'job_duration_seconds', 'Background job run time.', LATENCY_BUCKETS))
+        self._family(state, _Histogram(
+            'job_latency_seconds', 'Time from enqueue to completion of background jobs.',
+            LATENCY_BUCKETS + [30.0, 60.0, 300.0, 900.0]))
+        if app.config['METRICS_ENABLED']:
+            with app.app_context():
+                self._listen(db.engine)
+
+    def _family(self, state, family):
+        state.families[family.name] = family
+        return family
+
+    @property
+    def _state(self):
+        return current_app.extensions['metrics']
+
+    def _listen(self, engine):
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            stats = _current.get()
+            if stats is not None:
+                stats.statement_started = clock.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            stats = _current.get()
+            if stats is not None:
+                elapsed = clock.perf_counter() - stats.statement_started
+                stats.statements += 1
+                stats.sql_time += elapsed
+                if stats.log is not None and len(stats.log) < stats.log_limit:
+                    stats.log.append((elapsed, statement))
+            elif has_app_context():
+                self.inc('db_statements_total', ())
+
+    def inc(self, name, labels, amount=1):
+        state = self._state
+        with state.lock:
+            state.families[name].inc(labels, amount)
+
+    def observe(self, name, labels, value):
+        state = self._state
+        with state.lock:
+            state.families[name].observe(labels, value)
+
+    def set_gauge(self, name, help_text, value, labels=()):
+        state = self._state
+        with state.lock:
+            family = state.families.get(name)
+            if family is None:
+                family = self._family(state, _Gauge(name, help_text))
+            family.set(labels, value)
+
+    def start_request(self):
+        if current_app.config['METRICS_ENABLED']:
+            keep = current_app.config['SLOW_REQUEST_THRESHOLD'] is not None
+            stats = _RequestStats(current_app.config['SLOW_REQUEST_MAX_STATEMENTS'] if keep else 0)
+            stats.token = _current.set(stats)
+
+    def finish_request(self, status):
+        stats = _current.get()
+        if stats is None:
+            return
+        _current.reset(stats.token)
+        elapsed = clock.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unknown'
+        labels = (('endpoint', endpoint),)
+        state = self._state
+        with state.lock:
+            families = state.families
+            families['http_request_duration_seconds'].observe(labels, elapsed)
+            families['http_requests_total'].inc(
+                (('endpoint', endpoint), ('method', request.method), ('status', str(status))))
+            families['db_statements_per_request'].observe(labels, stats.statements)
+            families['db_time_per_request_seconds'].observe(labels, stats.sql_time)
+            families['db_statements_total'].inc((), stats.statements)
+
+        threshold = current_app.config['SLOW_REQUEST_THRESHOLD']
+        if threshold is not None and elapsed >= threshold:
+            self.inc('http_slow_requests_total', labels)
+            lines = [f'  {duration * 1000:8.2f} ms  {" ".join(statement.split())}'
+                     for duration, statement in stats.log]
+            current_app.logger.warning(
+                'Slow request %s %s (%s): %.1f ms, %d statements, %.1f ms in SQL\n%s',
+                request.method, request.full_path.rstrip('?'), endpoint, elapsed * 1000,
+                stats.statements, stats.sql_time * 1000, '\n'.join(lines),
+            )
+
+    def render(self):
+        state = self._state
+        with state.lock:
+            lines = [line for family in state.families.values() for line in family.render()]
+        return '\n'.join(lines) + '\n'
@@ -1,39 +1,224 @@
 from datetime import datetime
-from app import db, login_manager
+from app import db, login_manager, identity_cache, password_hasher
+from app.availability import SLOT_MINUTES, to_minutes, from_minutes
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity_cache.load(int(user_id))
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
     contact_phone = db.Column(db.String(20))
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     is_admin = db.Column(db.Boolean, default=False)
+    # Optimistic lock: every UPDATE matches on the version that was read and
+    # bumps it, so a write based on an outdated copy changes nothing and
+    # raises StaleDataError instead of overwriting a newer change. Sessions
+    # also remember the version they last saw, so a cached copy from before a
+    # change is never served to them.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     reservations = db.relationship('Reservation', back_populates='user')
 
+    __mapper_args__ = {'version_id_col': version}
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
 class Room(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), index=True, unique=True)
     reservations = db.relationship('Reservation', back_populates='room')
 
+def default_end_time(context):
+    # Rows created without an explicit end keep the old single-slot meaning.
+    # A 23:45 slot ends at 23:59, since an end of midnight would sort before
+    # its start; the booking forms and /availability never reach that slot.
+    start = context.get_current_parameters()['time']
+    return from_minutes(min(to_minutes(start) + SLOT_MINUTES, 24 * 60 - 1))
+
 class Reservation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
     time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False, default=default_end_time)
     canceled = db.Column(db.Boolean, default=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
+    # Optimistic lock, as on User. Bulk UPDATEs outside the ORM bump it too.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     user = db.relationship('User', back_populates='reservations')
     room = db.relationship('Room', back_populates='reservations')
+
+    __mapper_args__ = {'version_id_col': version}
+    # Ids are never handed out twice, even on SQLite after the newest rows
+    # were archived or deleted: reservation_history keeps the original ids,
+    # and a stale form naming an old id must not reach a new booking.
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    @classmethod
+    def overlapping(cls, room_id, start, end):
+        return db.and_(
+            cls.room_id == room_id,
+            cls.canceled == False,
+            cls.time < end,
+            cls.end_time > start,
+        )
+
+    @classmethod
+    def guarded_insert(cls):
+        # Live reservations of a room never overlap, so only the latest one
+        # starting before `end` can reach into [start, end). That is a single
+        # seek on the (room_id, date, time) index however full the day is.
+        # Check and insert are one statement, which SQLite runs under its write
+        # lock, so two overlapping bookings cannot both get in.
+        start = db.bindparam('start', type_=db.Time)
+        end = db.bindparam('end', type_=db.Time)
+        date = db.bindparam('date', type_=db.Date)
+        room_id = db.bindparam('room_id', type_=db.Integer)
+        latest = (
+            db.select(cls.end_time)
+            .where(cls.room_id == room_id, cls.date == date, cls.canceled == False, cls.time < end)
+            .order_by(cls.time.desc())
+            .limit(1)
+            .subquery()
+        )
+        conflict = db.select(latest.c.end_time).where(latest.c.end_time > start).exists()
+        values = db.select(
+            db.bindparam('user_id', type_=db.Integer), room_id, date, start, end, db.false(),
+        ).where(~conflict)
+        return db.insert(cls.__table__).from_select(
+            ['user_id', 'room_id', 'date', 'time', 'end_time', 'canceled'], values
+        )
+
+    @classmethod
+    def insert_if_free(cls, user_id, room_id, date, start, end):
+        params = {'user_id': user_id, 'room_id': room_id, 'date': date, 'start': start, 'end': end}
+        if db.session.get_bind().dialect.name == 'sqlite':
+            return db.session.execute(cls.guarded_insert(), params).rowcount == 1
+        # Elsewhere a concurrent booking can still be refused by the overlap
+        # constraint below; the savepoint keeps the caller's transaction (a
+        # cancellation promoting the waitlist, say) usable when it is.
+        try:
+            with db.session.begin_nested():
+                return db.session.execute(cls.guarded_insert(), params).rowcount == 1
+        except IntegrityError:
+            return False
+
+# Only one live (non-canceled) reservation may hold a room slot; the database
+# enforces this so concurrent bookings cannot both succeed.
+db.Index(
+    'uq_reservation_active_slot',
+    Reservation.room_id, Reservation.date, Reservation.time,
+    unique=True,
+    sqlite_where=Reservation.canceled == db.false(),
+    postgresql_where=Reservation.canceled == db.false(),
+)
+
+# guarded_insert() is only atomic under SQLite's single writer. On
+# PostgreSQL, two overlapping bookings with different start times can both
+# pass its NOT EXISTS under READ COMMITTED, so the database refuses them
+# itself: live reservations of a room may not overlap in time. A violation
+# raises IntegrityError, as the unique slot index does.
+NO_OVERLAP_DDL = '''
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+ALTER TABLE reservation ADD CONSTRAINT reservation_no_overlap EXCLUDE USING gist (
+    room_id WITH =, tsrange(date + "time", date + end_time) WITH &&
+) WHERE (NOT canceled)
+'''
+db.event.listen(Reservation.__table__, 'after_create', db.DDL(NO_OVERLAP_DDL).execute_if(dialect='postgresql'))
+
+# Admin listings seek on (date, time, id), optionally narrowed by room or user.
+# Canceled rows never show up there, so the indexes only cover live rows; the
+# slot index above already serves the room-filtered listing.
+db.Index(
+    'ix_reservation_live_date_time',
+    Reservation.date, Reservation.time, Reservation.id,
+    sqlite_where=Reservation.canceled == db.false(),
+    postgresql_where=Reservation.canceled == db.false(),
+)
+db.Index(
+    'ix_reservation_live_user_date_time',
+    Reservation.user_id, Reservation.date, Reservation.time, Reservation.id,
+    sqlite_where=Reservation.canceled == db.false(),
+    postgresql_where=Reservation.canceled == db.false(),
+)
+
+# Users waiting for a slot that was taken when they asked for it; the id is
+# the order they joined in. app/waitlist.py books them in when a cancellation
+# frees the slot. A user waits at most once per room and start time.
+class WaitlistEntry(db.Model):
+    __tablename__ = 'waitlist'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Promotion seeks the queue of a room and day in join order.
+db.Index('ix_waitlist_slot', WaitlistEntry.room_id, WaitlistEntry.date, WaitlistEntry.time, WaitlistEntry.id)
+db.Index('uq_waitlist_user_slot', WaitlistEntry.user_id, WaitlistEntry.room_id, WaitlistEntry.date,
+         WaitlistEntry.time, unique=True)
+
+# Canceled and past reservations moved out of the reservation table by
+# app/archive.py, keeping their original ids, for reports.
+class ReservationHistory(db.Model):
+    __tablename__ = 'reservation_history'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    canceled = db.Column(db.Boolean, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+db.Index('ix_reservation_history_date_time', ReservationHistory.date, ReservationHistory.time,
+         ReservationHistory.id)
+db.Index('ix_reservation_history_room_date', ReservationHistory.room_id, ReservationHistory.date)
+db.Index('ix_reservation_history_user_date', ReservationHistory.user_id, ReservationHistory.date)
+
+# Booked minutes per room and clock hour, kept up to date by app/utilization.py
+# in the same transaction as each booking or cancellation, so reports read a
+# bounded number of rows instead of scanning reservations. The primary key
+# leads with the date for range reads across all rooms.
+class RoomUtilization(db.Model):
+    __tablename__ = 'room_utilization'
+    date = db.Column(db.Date, primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    booked_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+# Availability events on their way to other worker processes, when
+# EVENTS_BACKEND is 'database' (see app/events.py). Rows only live for
+# EVENTS_RETENTION seconds.
+class AvailabilityEvent(db.Model):
+    __tablename__ = 'availability_event'
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    payload = db.Column(db.Text, nullable=False)
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+
+# Workers look for the oldest due job of a given status.
+db.Index('ix_job_status_run_at', Job.status, Job.run_at)
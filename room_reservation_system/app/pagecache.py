@@ -0,0 +1,112 @@
+import threading
+import time as clock
+from collections import OrderedDict
+from email.utils import formatdate
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from werkzeug.http import unquote_etag
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> (body, mimetype, headers, last_modified, expires_at), least recent first
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+# Bounded LRU/TTL cache of whole rendered pages for anonymous visitors. Views
+# decorated with @page_cache.cached render once per PAGE_CACHE_TTL seconds and
+# URL; every response carries an ETag and Last-Modified, so a browser that
+# already has the page gets a 304 without a body. Logged-in users and
+# requests with flashed messages waiting bypass the cache, since their pages
+# differ. Pages with a form (and so a per-session CSRF token) must not use it.
+class PageCache:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGE_CACHE_SIZE', 256)
+        app.config.setdefault('PAGE_CACHE_TTL', 300)
+        app.extensions['page_cache'] = _State()
+
+    @property
+    def _state(self):
+        return current_app.extensions['page_cache']
+
+    def _get(self, key):
+        state = self._state
+        with state.lock:
+            entry = state.entries.get(key)
+            if entry is not None and entry[4] < clock.monotonic():
+                del state.entries[key]
+                entry = None
+            if entry is None:
+                state.misses += 1
+                return None
+            state.entries.move_to_end(key)
+            state.hits += 1
+            return entry
+
+    def _put(self, key, response):
+        response.add_etag()
+        body = response.get_data()
+        # Whole seconds, as Last-Modified and If-Modified-Since carry them.
+        last_modified = int(clock.time())
+        headers = {
+            'ETag': response.headers['ETag'],
+            'Last-Modified': formatdate(last_modified, usegmt=True),
+            # Browsers revalidate each time, which costs a 304 at most.
+            'Cache-Control': 'public, no-cache',
+        }
+        entry = (body, response.mimetype, headers, last_modified,
+                 clock.monotonic() + current_app.config['PAGE_CACHE_TTL'])
+        state = self._state
+        with state.lock:
+            state.entries[key] = entry
+            state.entries.move_to_end(key)
+            while len(state.entries) > current_app.config['PAGE_CACHE_SIZE']:
+                state.entries.popitem(last=False)
+        return entry
+
+    def _fresh(self, etag, last_modified):
+        # The client's copy is current: If-None-Match wins when sent, as in
+        # RFC 9110, otherwise If-Modified-Since is compared.
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(unquote_etag(etag)[0])
+        since = request.if_modified_since
+        return since is not None and since.timestamp() >= last_modified
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (request.method not in ('GET', 'HEAD') or not current_app.config['PAGE_CACHE_TTL']
+                    or current_user.is_authenticated or session.get('_flashes')):
+                return view(*args, **kwargs)
+
+            key = request.full_path
+            entry = self._get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.headers.get('Set-Cookie'):
+                    return response
+                entry = self._put(key, response)
+            body, mimetype, headers, last_modified, _ = entry
+            if self._fresh(headers['ETag'], last_modified):
+                return current_app.response_class(status=304, headers=headers)
+            return current_app.response_class(body, mimetype=mimetype, headers=headers)
+        return wrapper
+
+    def clear(self):
+        state = self._state
+        with state.lock:
+            state.entries.clear()
+
+    def stats(self):
+        state = self._state
+        with state.lock:
+            return {'size': len(state.entries), 'hits': state.hits, 'misses': state.misses}
@@ -0,0 +1,231 @@
+import threading
+import time as clock
+from collections import OrderedDict
+
+from flask import current_app, g, request
+from flask_login import current_user
+from werkzeug.utils import import_string
+
+# endpoint -> {scope: (requests per minute, burst)}. 'default' covers every
+# request to the main blueprint; an endpoint's own rule applies on top of it
+# to requests that change something (not GET/HEAD/OPTIONS). 'ip' buckets are
+# per client address, 'user' buckets per logged-in user, or per username
+# tried from one address when logging in.
+DEFAULT_RULES = {
+    'default': {'ip': (600, 120), 'user': (300, 60)},
+    'main.login': {'ip': (30, 10), 'user': (10, 5)},
+    'main.reserve': {'ip': (120, 30), 'user': (30, 10)},
+    'main.reserve_recurring': {'ip': (60, 15), 'user': (10, 5)},
+}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    pass
+
+
+# Token buckets of this process, spread over lock stripes so requests for
+# different keys rarely wait on each other. Each stripe keeps its most
+# recently used share of RATELIMIT_MAX_KEYS buckets; one that is dropped
+# comes back full, which only errs towards letting requests through.
+class MemoryBackend:
+    STRIPES = 16
+
+    def __init__(self, app):
+        self.capacity = max(1, app.config['RATELIMIT_MAX_KEYS'] // self.STRIPES)
+        self.stripes = [(threading.Lock(), OrderedDict()) for _ in range(self.STRIPES)]
+
+    def take(self, key, rate, burst):
+        # Takes a token from the bucket refilled at `rate` per second up to
+        # `burst`; returns (allowed, seconds until a token is available).
+        lock, buckets = self.stripes[hash(key) % self.STRIPES]
+        now = clock.monotonic()
+        with lock:
+            tokens, updated = buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            buckets[key] = (tokens, now)
+            if len(buckets) > self.capacity:
+                buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def size(self):
+        return sum(len(buckets) for _, buckets in self.stripes)
+
+
+# The same buckets in Redis (RATELIMIT_STORAGE_URL), shared by every worker
+# process. Needs the redis package; the memory backend stands in for it
+# anywhere a per-process limit is good enough.
+class RedisBackend:
+    SCRIPT = '''
+        local now = redis.call('TIME')
+        now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or burst
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+        local allowed = tokens >= 1
+        if allowed then
+            tokens = tokens - 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+        if allowed then
+            return {1, '0'}
+        end
+        return {0, tostring((1 - tokens) / rate)}
+    '''
+
+    def __init__(self, app):
+        import redis
+
+        self.client = redis.Redis.from_url(app.config['RATELIMIT_STORAGE_URL'])
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, retry_after = self.script(keys=[f'ratelimit:{key}'], args=[rate, burst])
+        return bool(allowed), float(retry_after)
+
+    def size(self):
+        return None
+
+
+BACKENDS = {'memory': MemoryBackend, 'redis': RedisBackend}
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.backend = None
+
+
+# Rate limiting and load shedding for the main blueprint, checked before each
+# view runs so a refused request costs next to nothing.
+#
+# Shedding comes first: a request that waited longer than
+# RATELIMIT_SHED_QUEUE_TIME seconds in front of the worker (from the
+# X-Request-Start header the proxy sets) or that finds RATELIMIT_MAX_IN_FLIGHT
+# requests already running in this process gets a 503, as answering it late
+# would only delay the ones behind it. Then each request takes a token from
+# its RATELIMIT_RULES buckets and gets a 429 with Retry-After when one is
+# empty. RATELIMIT_BACKEND is 'memory' (per process), 'redis', or the import
+# path of a class with the same interface. If the backend fails, requests
+# are let through.
+class RateLimiter:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_BACKEND', 'memory')
+        app.config.setdefault('RATELIMIT_STORAGE_URL', None)
+        app.config.setdefault('RATELIMIT_RULES', DEFAULT_RULES)
+        app.config.setdefault('RATELIMIT_EXEMPT', ())
+        app.config.setdefault('RATELIMIT_MAX_KEYS', 100000)
+        app.config.setdefault('RATELIMIT_SHED_QUEUE_TIME', 5.0)
+        app.config.setdefault('RATELIMIT_MAX_IN_FLIGHT', None)
+        app.config.setdefault('RATELIMIT_SHED_RETRY_AFTER', 5)
+        state = app.extensions['rate_limiter'] = _State()
+        if app.config['RATELIMIT_ENABLED']:
+            backend = app.config['RATELIMIT_BACKEND']
+            if isinstance(backend, str):
+                backend = BACKENDS.get(backend) or import_string(backend)
+            state.backend = backend(app)
+
+    @property
+    def _state(self):
+        return current_app.extensions['rate_limiter']
+
+    def check(self):
+        config = current_app.config
+        if not config['RATELIMIT_ENABLED'] or request.endpoint in config['RATELIMIT_EXEMPT']:
+            return
+        state = self._state
+        with state.lock:
+            state.in_flight += 1
+        g.rate_limiter_in_flight = True
+        self._shed(state, config)
+
+        from app import metrics
+
+        rules = config['RATELIMIT_RULES']
+        buckets = [('default', rules['default'])]
+        if request.method not in SAFE_METHODS and request.endpoint in rules:
+            buckets.append((request.endpoint, rules[request.endpoint]))
+        identities = {'ip': request.remote_addr, 'user': self._user()}
+        for name, limits in buckets:
+            for scope, (per_minute, burst) in limits.items():
+                identity = identities[scope]
+                if identity is None:
+                    continue
+                try:
+                    allowed, retry_after = state.backend.take(f'{name}:{scope}:{identity}', per_minute / 60, burst)
+                except Exception:
+                    current_app.logger.warning('Rate limiter backend failed; request let through', exc_info=True)
+                    metrics.inc('ratelimit_backend_errors_total', ())
+                    return
+                if not allowed:
+                    metrics.inc('ratelimit_limited_total',
+                                (('endpoint', request.endpoint or 'unknown'), ('scope', scope)))
+                    raise RateLimited(retry_after)
+
+    def _shed(self, state, config):
+        from app import metrics
+
+        queued = self._queue_time()
+        if queued is not None:
+            metrics.observe('http_queue_seconds', (), queued)
+            if config['RATELIMIT_SHED_QUEUE_TIME'] is not None and queued > config['RATELIMIT_SHED_QUEUE_TIME']:
+                metrics.inc('ratelimit_shed_total', (('reason', 'queue_time'),))
+                raise Overloaded()
+        limit = config['RATELIMIT_MAX_IN_FLIGHT']
+        if limit is not None and state.in_flight > limit:
+            metrics.inc('ratelimit_shed_total', (('reason', 'in_flight'),))
+            raise Overloaded()
+
+    def _queue_time(self):
+        # X-Request-Start is "t=<time since the epoch>", in seconds (nginx's
+        # $msec), milliseconds or microseconds depending on the proxy.
+        value = request.headers.get('X-Request-Start')
+        if not value:
+            return None
+        try:
+            started = float(value.removeprefix('t='))
+        except ValueError:
+            return None
+        while started > 1e11:
+            started /= 1000
+        return max(0.0, clock.time() - started)
+
+    def _user(self):
+        if current_user.is_authenticated:
+            return str(current_user.id)
+        # Login attempts count against the account being tried from this
+        # address, so guessing at one account from elsewhere cannot lock its
+        # owner out; the 'ip' bucket caps guesses across accounts.
+        username = request.form.get('username') if request.method == 'POST' else None
+        return f'name:{username.lower()}@{request.remote_addr}' if username else None
+
+    def release(self):
+        if g.pop('rate_limiter_in_flight', False):
+            state = self._state
+            with state.lock:
+                state.in_flight -= 1
+
+    def stats(self):
+        state = self._state
+        return {
+            'in_flight': state.in_flight,
+            'buckets': state.backend.size() if state.backend is not None else 0,
+        }
@@ -1,12 +1,75 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+import csv
+import io
+import hmac
+import json
+import math
+from datetime import date, time, timedelta
+from flask import (Blueprint, Response, abort, current_app, flash, jsonify, redirect,
+                   render_template, request, stream_with_context, url_for)
 from flask_login import current_user, login_user, logout_user, login_required
-from app import db
-from app.models import User, Reservation, Room
-from app.forms import LoginForm, ResetPasswordForm, ReservationForm, RegistrationForm
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.datastructures import MultiDict
+from app import (db, availability, room_catalog, identity_cache, page_cache, password_hasher, metrics,
+                 jobs, mail, utilization, events, waitlist, rate_limiter)
+from app.availability import (SLOT_MINUTES, SLOTS_PER_DAY, from_minutes, free_windows,
+                              occupancy_grid, slot_time, to_minutes)
+from app.hashing import HasherBusy
+from app.metrics import CONTENT_TYPE
+from app.events import TooManySubscribers
+from app.ratelimit import Overloaded, RateLimited
+from app.waitlist import AlreadyBooked
+from app.models import User, Reservation, ReservationHistory, Room
+from app.forms import LoginForm, ProfileForm, ResetPasswordForm, ReservationForm, RecurringReservationForm
 
 bp = Blueprint('main', __name__)
 
+CHANGED_MEANWHILE = ('This reservation was changed by someone else since the page was loaded; '
+                     'review it and try again.')
+
+@bp.before_request
+def start_metrics():
+    metrics.start_request()
+
+@bp.before_request
+def limit_request():
+    rate_limiter.check()
+
+@bp.after_request
+def record_metrics(response):
+    metrics.finish_request(response.status_code)
+    return response
+
+@bp.teardown_request
+def record_failed_request(error):
+    # Only still pending if the view raised and no response was made.
+    if error is not None:
+        metrics.finish_request(500)
+
+@bp.teardown_request
+def release_rate_limiter(error):
+    rate_limiter.release()
+
+@bp.app_errorhandler(HasherBusy)
+def hasher_busy(error):
+    return 'The server is busy, please try again shortly.', 503, {'Retry-After': '5'}
+
+@bp.app_errorhandler(Overloaded)
+def overloaded(error):
+    retry_after = current_app.config['RATELIMIT_SHED_RETRY_AFTER']
+    return 'The server is busy, please try again shortly.', 503, {'Retry-After': str(retry_after)}
+
+@bp.app_errorhandler(TooManySubscribers)
+def too_many_subscribers(error):
+    retry_after = current_app.config['EVENTS_RETRY_AFTER']
+    return 'Too many live updates open, please try again shortly.', 503, {'Retry-After': str(retry_after)}
+
+@bp.app_errorhandler(RateLimited)
+def rate_limited(error):
+    return 'Too many requests, please slow down.', 429, {'Retry-After': str(max(1, math.ceil(error.retry_after)))}
+
 @bp.route('/')
+@page_cache.cached
 def index():
     if current_user.is_authenticated:
         if current_user.is_admin:
@@ -26,6 +89,15 @@ def login():
         if user is None or not user.check_password(form.password.data):
             flash('Invalid username or password', 'danger')
         else:
+            if password_hasher.needs_rehash(user.password_hash):
+                # Upgrade the stored hash to the configured scheme and cost
+                # while the plaintext is at hand.
+                user.set_password(form.password.data)
+                try:
+                    db.session.commit()
+                except StaleDataError:
+                    # Changed meanwhile; the upgrade waits for the next login.
+                    db.session.rollback()
             login_user(user, remember=form.remember_me.data)
             return redirect(url_for('main.index'))
     
@@ -42,52 +114,336 @@ def logout():
 def reserve():
     form = ReservationForm()
     if form.validate_on_submit():
-        room = Room.query.filter_by(name=form.room.data).first()
+        room = room_catalog.get(form.room.data)
         
         if room is None:
             flash('Selected room does not exist.', 'danger')
             return redirect(url_for('main.reserve'))
 
-        existing_reservation = Reservation.query.filter_by(
-            room_id=room.id,
-            date=form.date.data,
-            time=form.time.data,
-            canceled=False
-        ).first()
-        
-        if existing_reservation:
-            flash('This room is already reserved for the selected date and time.', 'danger')
-        else:
-            reservation = Reservation(
-                user_id=current_user.id,
-                room_id=room.id,
-                date=form.date.data,
-                time=form.time.data
-            )
-            db.session.add(reservation)
-            try:
-                db.session.commit()
-                flash('Room reserved successfully!', 'success')
-            except Exception as e:
-                db.session.rollback()
-                flash('An error occurred while saving the reservation.', 'danger')
+        start = form.time.data
+        end = from_minutes(to_minutes(start) + form.duration.data)
+        # Only the guarded insert decides. The availability cache can be up to
+        # AVAILABILITY_TTL seconds behind a cancellation in another worker,
+        # so refusing on its word could turn away a slot that is free.
+        place = None
+        try:
+            booked = Reservation.insert_if_free(current_user.id, room.id, form.date.data, start, end)
+            if booked:
+                utilization.book([(room.id, form.date.data, start, end)])
+                events.taken(room.id, room.name, form.date.data, start, end)
+                mail.booking_confirmed(current_user.email, room.name, [form.date.data], start, end)
+            elif form.waitlist.data:
+                place = waitlist.join(current_user.id, room.id, form.date.data, start, end)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            booked = False
+        except AlreadyBooked:
+            db.session.rollback()
+            flash('You already have a reservation in this room that overlaps the selected time.', 'danger')
+            return render_template('reserve.html', form=form)
+        except Exception as e:
+            db.session.rollback()
+            flash('An error occurred while saving the reservation.', 'danger')
             return redirect(url_for('main.index'))
+        if place is not None:
+            flash(f'This room is already reserved for the selected date and time. You are number {place} '
+                  f'on the waitlist and will get the slot automatically if it is freed.', 'info')
+            return redirect(url_for('main.user_reservations'))
+        if not booked:
+            if form.waitlist.data:
+                flash(f'This room is already reserved for the selected date and time, and you cannot wait '
+                      f'for more than {current_app.config["WAITLIST_MAX_PER_USER"]} slots at once.', 'danger')
+            else:
+                flash('This room is already reserved for the selected date and time.', 'danger')
+            return render_template('reserve.html', form=form, offer_waitlist=not form.waitlist.data)
+        availability.occupy(room.id, form.date.data, start, end)
+        flash('Room reserved successfully!', 'success')
+        return redirect(url_for('main.index'))
     return render_template('reserve.html', form=form)
 
+@bp.route('/reserve/recurring', methods=['GET', 'POST'])
+@login_required
+def reserve_recurring():
+    form = RecurringReservationForm()
+    results = None
+    if form.validate_on_submit():
+        room = room_catalog.get(form.room.data)
+        if room is None:
+            flash('Selected room does not exist.', 'danger')
+            return redirect(url_for('main.reserve_recurring'))
+
+        start = form.time.data
+        end = from_minutes(to_minutes(start) + form.duration.data)
+        dates = []
+        day = form.date.data
+        while day <= form.until.data:
+            dates.append(day)
+            day += timedelta(days=form.every.data)
+
+        # One set-based query finds every date that already clashes, and the
+        # rest go in as a single executemany of the guarded insert, all in one
+        # transaction.
+        taken = {
+            row.date for row in db.session.query(Reservation.date)
+            .filter(Reservation.overlapping(room.id, start, end), Reservation.date.in_(dates))
+            .distinct()
+        }
+        candidates = [day for day in dates if day not in taken]
+        booked = set()
+        retry = set()
+        try:
+            if candidates:
+                result = db.session.execute(Reservation.guarded_insert(), [
+                    {'user_id': current_user.id, 'room_id': room.id, 'date': day, 'start': start, 'end': end}
+                    for day in candidates
+                ])
+                booked = set(candidates)
+                if result.rowcount != len(candidates):
+                    # Someone booked one of the dates in between; find out which
+                    # of ours actually went in.
+                    booked = {
+                        row.date for row in db.session.query(Reservation.date).filter(
+                            Reservation.room_id == room.id, Reservation.user_id == current_user.id,
+                            Reservation.date.in_(candidates), Reservation.time == start,
+                            Reservation.end_time == end, Reservation.canceled == False,
+                        )
+                    }
+            if booked:
+                utilization.book([(room.id, day, start, end) for day in booked])
+                for day in sorted(booked):
+                    events.taken(room.id, room.name, day, start, end)
+                mail.booking_confirmed(current_user.email, room.name, booked, start, end)
+            db.session.commit()
+        except IntegrityError:
+            # A booking that raced ours took one of the dates and the whole
+            # series rolled back. Only the dates now clashing are taken; the
+            # rest are still free and worth another try.
+            db.session.rollback()
+            booked = set()
+            taken = {
+                row.date for row in db.session.query(Reservation.date)
+                .filter(Reservation.overlapping(room.id, start, end), Reservation.date.in_(dates))
+                .distinct()
+            }
+            retry = set(dates) - taken
+        except Exception as e:
+            db.session.rollback()
+            flash('An error occurred while saving the reservations.', 'danger')
+            return redirect(url_for('main.index'))
+
+        for day in booked:
+            availability.occupy(room.id, day, start, end)
+        results = [
+            (day, 'Reserved' if day in booked else 'Not saved, try again' if day in retry else 'Already taken')
+            for day in dates
+        ]
+        flash(f'{len(booked)} of {len(dates)} reservations created.', 'success' if booked else 'danger')
+        if retry:
+            flash('Another booking came in at the same time, so none of the free dates were saved. '
+                  'Please submit the series again.', 'danger')
+    return render_template('reserve_recurring.html', form=form, results=results)
+
+@bp.route('/availability')
+@login_required
+def room_availability():
+    first_day = request.args.get('from', date.today(), type=_parse_date)
+    last_day = request.args.get('to', first_day, type=_parse_date)
+    if last_day < first_day or (last_day - first_day).days >= current_app.config['AVAILABILITY_MAX_DAYS']:
+        abort(400)
+    duration = request.args.get('duration', SLOT_MINUTES, type=int)
+
+    rooms = room_catalog.all()
+    if request.args.get('room'):
+        rooms = [room for room in rooms if room.name == request.args['room']]
+    if not rooms:
+        abort(404)
+
+    grid = occupancy_grid([room.id for room in rooms], first_day, last_day)
+    free = {room.name: {} for room in rooms}
+    # Reservations must end before midnight (end_time is a time of day), so
+    # the day's last slot is left out and windows end by 23:45 at the latest.
+    bookable = grid[:, :, :SLOTS_PER_DAY - 1]
+    for r, d, first, end in zip(*free_windows(bookable, max(1, -(-duration // SLOT_MINUTES)))):
+        day = (first_day + timedelta(days=int(d))).isoformat()
+        free[rooms[r].name].setdefault(day, []).append([
+            slot_time(first).strftime('%H:%M'), slot_time(end).strftime('%H:%M'),
+        ])
+    return jsonify({
+        'from': first_day.isoformat(),
+        'to': last_day.isoformat(),
+        'slot_minutes': SLOT_MINUTES,
+        'free': free,
+    })
+
+@bp.route('/events')
+@login_required
+def availability_events():
+    # Server-sent slot-taken / slot-freed events for one room (or all) and a
+    # date range, so pages can refresh free times when something changes
+    # instead of polling /availability.
+    first_day = request.args.get('from', date.today(), type=_parse_date)
+    last_day = request.args.get('to', first_day, type=_parse_date)
+    if last_day < first_day or (last_day - first_day).days >= current_app.config['AVAILABILITY_MAX_DAYS']:
+        abort(400)
+    room_ids = None
+    if request.args.get('room'):
+        room = room_catalog.get(request.args['room'])
+        if room is None:
+            abort(404)
+        room_ids = {room.id}
+
+    subscription = events.subscribe(room_ids, first_day, last_day)
+    response = Response(events.stream(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @bp.route('/reservations')
 @login_required
 def user_reservations():
-    reservations = Reservation.query.filter_by(user_id=current_user.id, canceled=False).all()
-    return render_template('user_reservations.html', reservations=reservations)
+    # The template shows each reservation's room; load them in the same query.
+    reservations = (
+        Reservation.query.options(db.joinedload(Reservation.room, innerjoin=True))
+        .filter_by(user_id=current_user.id, canceled=False)
+        .order_by(Reservation.date, Reservation.time)
+        .all()
+    )
+    waiting = waitlist.entries(current_user.id)
+    room_names = {room.id: room.name for room in room_catalog.all()} if waiting else {}
+    return render_template('user_reservations.html', reservations=reservations, waiting=waiting,
+                           room_names=room_names)
+
+@bp.route('/waitlist/leave', methods=['POST'])
+@login_required
+def leave_waitlist():
+    if waitlist.leave(current_user.id, request.form.get('entry_id', type=int)):
+        db.session.commit()
+        flash('You left the waitlist.', 'success')
+    else:
+        flash('Waitlist entry not found.', 'danger')
+    return redirect(url_for('main.user_reservations'))
+
+def _parse_date(value):
+    return date.fromisoformat(value)
+
+def _parse_cursor(value):
+    day, start, reservation_id = value.split(',')
+    return date.fromisoformat(day), time.fromisoformat(start), int(reservation_id)
+
+def _admin_filters(model=Reservation, args=None):
+    args = request.args if args is None else args
+    filters = {
+        'room': args.get('room', type=int),
+        'user': args.get('user', '').strip() or None,
+        'from': args.get('from', type=_parse_date),
+        'to': args.get('to', type=_parse_date),
+    }
+    # History keeps canceled reservations too; reports tell them apart.
+    criteria = [Reservation.canceled == False] if model is Reservation else []
+    if filters['room']:
+        criteria.append(model.room_id == filters['room'])
+    if filters['user']:
+        # A subquery rather than a join, so the criteria also work in an
+        # UPDATE and the user's date index can serve the listing.
+        criteria.append(model.user_id == db.select(User.id).where(User.username == filters['user'])
+                        .scalar_subquery())
+    if filters['from']:
+        criteria.append(model.date >= filters['from'])
+    if filters['to']:
+        criteria.append(model.date <= filters['to'])
+    return filters, criteria
 
 @bp.route('/admin_panel')
 @login_required
 def admin_panel():
     if not current_user.is_admin:
         return redirect(url_for('main.index'))
-    
-    reservations = db.session.query(Reservation, User, Room).join(User).join(Room).filter(Reservation.canceled == False).all()
-    return render_template('admin.html', reservations=reservations)
+
+    filters, criteria = _admin_filters()
+    per_page = request.args.get('per_page', current_app.config['ADMIN_PAGE_SIZE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['ADMIN_MAX_PAGE_SIZE']))
+    after = request.args.get('after', type=_parse_cursor)
+    if after:
+        # Seek past the last row of the previous page instead of OFFSET, so
+        # every page costs one index range scan however deep it is.
+        criteria.append(db.tuple_(Reservation.date, Reservation.time, Reservation.id) > after)
+
+    reservations = (
+        db.session.query(Reservation, User, Room).join(User).join(Room)
+        .filter(*criteria)
+        .order_by(Reservation.date, Reservation.time, Reservation.id)
+        .limit(per_page + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(reservations) > per_page:
+        reservations = reservations[:per_page]
+        last = reservations[-1][0]
+        next_cursor = f'{last.date.isoformat()},{last.time.isoformat()},{last.id}'
+
+    query_args = {key: value for key, value in filters.items() if value}
+    query_args['per_page'] = per_page
+    rooms = room_catalog.all()
+    return render_template('admin.html', reservations=reservations, rooms=rooms,
+                           filters=filters, query_args=query_args, next_cursor=next_cursor,
+                           paged=after is not None)
+
+@bp.route('/admin/export')
+@login_required
+def export_reservations():
+    if not current_user.is_admin:
+        return redirect(url_for('main.index'))
+
+    export_format = request.args.get('format', 'csv')
+    source = request.args.get('source', 'live')
+    if export_format not in ('csv', 'ndjson') or source not in ('live', 'history'):
+        abort(400)
+
+    # source=history reports on archived reservations, canceled ones included.
+    model = ReservationHistory if source == 'history' else Reservation
+    filters, criteria = _admin_filters(model)
+    fields = [model.id, model.date, model.time, model.end_time, Room.name, User.username]
+    columns = ['id', 'date', 'start', 'end', 'room', 'user']
+    if model is ReservationHistory:
+        fields.append(model.canceled)
+        columns.append('canceled')
+    statement = (
+        db.select(*fields)
+        .join(User, model.user_id == User.id).join(Room, model.room_id == Room.id)
+        .where(*criteria)
+        .order_by(model.date, model.time, model.id)
+        .execution_options(yield_per=current_app.config['EXPORT_BATCH_SIZE'])
+    )
+
+    def values(row):
+        return (row.id, row.date.isoformat(), row.time.strftime('%H:%M'),
+                row.end_time.strftime('%H:%M'), *row[4:])
+
+    def generate():
+        # Rows are pulled from the cursor one batch at a time and each batch
+        # is written out before the next is fetched, so memory stays flat
+        # however large the export is.
+        result = db.session.execute(statement)
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for batch in result.partitions():
+                writer.writerows(values(row) for row in batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for batch in result.partitions():
+                yield ''.join(json.dumps(dict(zip(columns, values(row)))) + '\n' for row in batch)
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    filename = 'reservation_history' if source == 'history' else 'reservations'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{export_format}'
+    return response
 
 @bp.route('/admin/cancel_reservation', methods=['POST'])
 @login_required
@@ -95,25 +451,208 @@ def cancel_reservation():
     if not current_user.is_admin:
         return redirect(url_for('main.index'))
     
-    reservation_id = request.form.get('reservation_id')
-    reservation = Reservation.query.get(reservation_id)
-    if reservation:
+    reservation_id = request.form.get('reservation_id', type=int)
+    # The version the panel showed; a reservation changed since then is not
+    # canceled blindly. Without one, whatever is current gets canceled.
+    seen = request.form.get('version', type=int)
+    reservation = db.session.get(Reservation, reservation_id) if reservation_id else None
+    if reservation is None:
+        flash('Reservation not found.', 'danger')
+    elif seen is not None and seen != reservation.version:
+        flash(CHANGED_MEANWHILE, 'danger')
+    elif reservation.canceled:
+        flash('Reservation was already canceled.', 'info')
+    else:
+        slot = (reservation.room_id, reservation.date, reservation.time, reservation.end_time)
         reservation.canceled = True
+        try:
+            # UPDATE ... WHERE version = <read>; matches nothing if another
+            # request changed or archived the row after it was read.
+            db.session.flush()
+        except StaleDataError:
+            db.session.rollback()
+            flash(CHANGED_MEANWHILE, 'danger')
+            return redirect(url_for('main.admin_panel'))
+        utilization.unbook([slot])
+        room = room_catalog.get_by_id(reservation.room_id)
+        events.freed(reservation.room_id, room and room.name, *slot[1:])
+        mail.booking_canceled(reservation.user.email, room.name if room else 'your room', *slot[1:])
+        promoted = waitlist.promote([slot])
         db.session.commit()
-        flash('Reservation canceled successfully.', 'success')
-    else:
-        flash('Reservation not found.', 'danger')
+        availability.release(*slot)
+        for booking in promoted:
+            availability.occupy(*booking)
+        if promoted:
+            flash('Reservation canceled; the slot went to the next user on the waitlist.', 'success')
+        else:
+            flash('Reservation canceled successfully.', 'success')
     
     return redirect(url_for('main.admin_panel'))
 
+@bp.route('/admin/reservations/cancel', methods=['POST'])
+@login_required
+def bulk_cancel_reservations():
+    # Cancels the reservations listed in `ids`, or every live one matching
+    # the admin filters (room, user, from, to), in one UPDATE. Takes a JSON
+    # body and answers with counts, or the admin panel's form and redirects
+    # back to it.
+    if not current_user.is_admin:
+        if request.is_json:
+            abort(403)
+        return redirect(url_for('main.index'))
+
+    data = request.get_json(silent=True) if request.is_json else None
+    if request.is_json and not isinstance(data, dict):
+        abort(400)
+    if data is None:
+        # The panel's form sends the checked rows, or all=1 with the filters.
+        ids = [] if request.form.get('all') else request.form.getlist('ids')
+        if not ids and not request.form.get('all'):
+            flash('No reservations selected.', 'info')
+            return redirect(url_for('main.admin_panel', **{
+                key: request.form[key] for key in ('room', 'user', 'from', 'to') if request.form.get(key)
+            }))
+        args = request.form
+    else:
+        ids = data.get('ids') or []
+        args = MultiDict({key: str(value) for key, value in data.items() if key != 'ids' and value is not None})
+    try:
+        ids = sorted({int(reservation_id) for reservation_id in ids})
+    except (TypeError, ValueError):
+        abort(400)
+    if len(ids) > current_app.config['BULK_CANCEL_MAX_IDS']:
+        abort(413)
+    filters, criteria = _admin_filters(args=args)
+    # A filter that did not parse is ignored by the listing, but here it
+    # would widen what gets canceled.
+    if any(args.get(key) and filters[key] is None for key in ('room', 'from', 'to')):
+        abort(400)
+    if ids:
+        criteria.append(Reservation.id.in_(ids))
+    elif not any(filters.values()):
+        # Never cancel every reservation by leaving the filters empty.
+        abort(400)
+
+    table = Reservation.__table__
+    columns = [table.c.id, table.c.user_id, table.c.room_id, table.c.date, table.c.time, table.c.end_time]
+    changes = {'canceled': True, 'version': table.c.version + 1}
+    statement = table.update().where(*criteria).values(**changes)
+    if db.session.get_bind().dialect.update_returning:
+        rows = db.session.execute(statement.returning(*columns)).all()
+    else:
+        rows = db.session.execute(
+            db.select(*columns).where(*criteria).with_for_update()
+        ).all()
+        if rows:
+            db.session.execute(table.update().where(table.c.id.in_([row.id for row in rows]))
+                               .values(**changes))
+
+    slots = [(row.room_id, row.date, row.time, row.end_time) for row in rows]
+    utilization.unbook(slots)
+    emails = dict(db.session.execute(
+        db.select(User.id, User.email).where(User.id.in_(list({row.user_id for row in rows})))
+    ).all()) if rows else {}
+    canceled_by_user = {}
+    for row, slot in zip(rows, slots):
+        room = room_catalog.get_by_id(row.room_id)
+        events.freed(row.room_id, room and room.name, *slot[1:])
+        canceled_by_user.setdefault(row.user_id, []).append((room.name if room else 'your room', *slot[1:]))
+    for user_id, canceled in canceled_by_user.items():
+        mail.bookings_canceled(emails.get(user_id), canceled)
+    promoted = waitlist.promote(slots)
+    db.session.commit()
+    for slot in slots:
+        availability.release(*slot)
+    for booking in promoted:
+        availability.occupy(*booking)
+
+    if data is not None:
+        result = {'canceled': len(rows), 'ids': sorted(row.id for row in rows), 'promoted': len(promoted)}
+        if ids:
+            result['skipped'] = len(ids) - len(rows)
+        return jsonify(result)
+    message = f'{len(rows)} reservation(s) canceled.'
+    if promoted:
+        message += f' {len(promoted)} freed slot(s) went to users on the waitlist.'
+    flash(message, 'success' if rows else 'info')
+    query_args = {key: value for key, value in filters.items() if value}
+    return redirect(url_for('main.admin_panel', **query_args))
+
+@bp.route('/admin/analytics/utilization')
+@login_required
+def utilization_analytics():
+    if not current_user.is_admin:
+        return redirect(url_for('main.index'))
+
+    last_day = request.args.get('to', date.today(), type=_parse_date)
+    first_day = request.args.get('from', last_day - timedelta(days=27), type=_parse_date)
+    if last_day < first_day or (last_day - first_day).days >= current_app.config['ANALYTICS_MAX_DAYS']:
+        abort(400)
+    rooms = room_catalog.all()
+    if request.args.get('room'):
+        rooms = [room for room in rooms if room.name == request.args['room']]
+    if not rooms:
+        abort(404)
+
+    import numpy as np
+
+    grid = utilization.heatmap([room.id for room in rooms], first_day, last_day)
+    # Share of each weekday's hour that was booked, over the whole range.
+    weekdays = np.array([(first_day + timedelta(days=d)).weekday() for d in range(grid.shape[1])])
+    hours_per_weekday = np.bincount(weekdays, minlength=7)[:, None] * 60
+    heatmaps = {}
+    for i, room in enumerate(rooms):
+        by_weekday = np.zeros((7, 24), dtype=np.int64)
+        np.add.at(by_weekday, weekdays, grid[i])
+        heatmaps[room.name] = {
+            'booked_minutes': {
+                (first_day + timedelta(days=d)).isoformat(): grid[i, d].tolist()
+                for d in np.nonzero(grid[i].any(axis=1))[0].tolist()
+            },
+            'weekday_hour': np.round(by_weekday / np.maximum(hours_per_weekday, 1), 4).tolist(),
+            'occupancy': round(float(grid[i].sum()) / (grid.shape[1] * 24 * 60), 4),
+        }
+    return jsonify({
+        'from': first_day.isoformat(),
+        'to': last_day.isoformat(),
+        'rooms': heatmaps,
+    })
+
+@bp.route('/admin/cache_stats')
+@login_required
+def cache_stats():
+    if not current_user.is_admin:
+        return redirect(url_for('main.index'))
+    return jsonify({'identity': identity_cache.stats(), 'pages': page_cache.stats()})
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    token = current_app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(404)
+    for key, value in identity_cache.stats().items():
+        metrics.set_gauge(f'identity_cache_{key}', f'Identity cache {key.replace("_", " ")}.', value)
+    for key, value in page_cache.stats().items():
+        metrics.set_gauge(f'page_cache_{key}', f'Page cache {key}.', value)
+    metrics.set_gauge('events_subscribers', 'Open /events streams in this process.', events.subscribers())
+    for key, value in rate_limiter.stats().items():
+        if value is not None:
+            metrics.set_gauge(f'ratelimit_{key}', f'Rate limiter {key.replace("_", " ")} in this process.', value)
+    for status, count in jobs.counts().items():
+        metrics.set_gauge('jobs_queued', 'Background jobs by status.', count, (('status', status),))
+    return Response(metrics.render(), mimetype=None, content_type=CONTENT_TYPE)
+
 @bp.route('/reset_password', methods=['GET', 'POST'])
 def reset_password():
     form = ResetPasswordForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         if user:
-            # Handle password reset logic here
-            flash('Password reset link sent to your email.', 'info')
+            mail.password_reset_requested(user.email)
+            db.session.commit()
+            flash('We have emailed you about your reset request. An administrator will complete it.', 'info')
             return redirect(url_for('main.login'))
         else:
             flash('Email not found.', 'danger')
@@ -127,18 +666,42 @@ def profile():
 @bp.route('/edit_profile', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
-    form = RegistrationForm(obj=current_user)
+    form = ProfileForm(obj=current_user, phone=current_user.contact_phone)
     if form.validate_on_submit():
+        # The version the form was filled from: saving over a profile changed
+        # since then (in another tab, or by another worker) is refused.
+        seen = request.form.get('version', type=int)
+        if seen is not None and seen != current_user.version:
+            return _profile_conflict(form)
         current_user.username = form.username.data
         current_user.email = form.email.data
         current_user.contact_phone = form.phone.data
         if form.password.data:
             current_user.set_password(form.password.data)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            # current_user came from an outdated cached copy, or the row
+            # changed between the check above and the UPDATE.
+            db.session.rollback()
+            identity_cache.invalidate([current_user.id])
+            return _profile_conflict(form)
+        except IntegrityError:
+            db.session.rollback()
+            flash('That username or email is already taken.', 'danger')
+            return render_template('edit_profile.html', form=form), 409
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('main.profile'))
     return render_template('edit_profile.html', form=form)
 
+def _profile_conflict(form):
+    # Keeps what was typed and renders the form with the current version,
+    # so saving again is a deliberate overwrite.
+    flash('Your profile was changed elsewhere since this page was loaded. '
+          'Check the values and save again.', 'danger')
+    return render_template('edit_profile.html', form=form), 409
+
 @bp.route('/explore')
+@page_cache.cached
 def explore():
     return render_template('explore.html')
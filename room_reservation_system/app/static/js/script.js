@@ -19,6 +19,87 @@ window.onload = function() {
 
     // Display any existing messages (errors, reservations, etc.)
     displayMessages();
+
+    // Show free times for the selected room and date on the reservation page
+    const reserveForm = document.getElementById('reserve-form');
+    if (reserveForm) {
+        ['room', 'date', 'duration'].forEach(function(name) {
+            reserveForm.elements[name].addEventListener('change', loadAvailability);
+        });
+        ['room', 'date'].forEach(function(name) {
+            reserveForm.elements[name].addEventListener('change', watchAvailability);
+        });
+        loadAvailability();
+        watchAvailability();
+    }
+}
+
+// Reload the free times whenever a slot of the selected room and date is
+// taken or freed, instead of the user reloading the page
+let availabilityEvents = null;
+let availabilityRetry = null;
+
+function watchAvailability() {
+    const form = document.getElementById('reserve-form');
+    const room = form.elements['room'].value;
+    const date = form.elements['date'].value;
+    clearTimeout(availabilityRetry);
+    if (availabilityEvents) {
+        availabilityEvents.close();
+        availabilityEvents = null;
+    }
+    if (!room || !date || !window.EventSource) {
+        return;
+    }
+
+    const params = new URLSearchParams({ room: room, from: date, to: date });
+    availabilityEvents = new EventSource(form.dataset.eventsUrl + '?' + params.toString());
+    ['slot-taken', 'slot-freed', 'reset'].forEach(function(type) {
+        availabilityEvents.addEventListener(type, loadAvailability);
+    });
+    // A busy server refuses the stream (503) and the browser gives up on it;
+    // try again later, catching up on anything missed meanwhile
+    availabilityEvents.addEventListener('error', function() {
+        if (availabilityEvents && availabilityEvents.readyState === EventSource.CLOSED) {
+            availabilityRetry = setTimeout(function() {
+                watchAvailability();
+                loadAvailability();
+            }, 30000);
+        }
+    });
+}
+
+// Function to fetch and list the free windows of the room selected in the reservation form
+function loadAvailability() {
+    const form = document.getElementById('reserve-form');
+    const list = document.getElementById('availability');
+    const room = form.elements['room'].value;
+    const date = form.elements['date'].value;
+    if (!room || !date) {
+        list.innerHTML = '';
+        return;
+    }
+
+    const params = new URLSearchParams({
+        room: room,
+        from: date,
+        to: date,
+        duration: form.elements['duration'].value
+    });
+    fetch(form.dataset.availabilityUrl + '?' + params.toString())
+        .then(function(response) { return response.json(); })
+        .then(function(data) {
+            const windows = (data.free[room] || {})[date] || [];
+            list.innerHTML = '';
+            if (windows.length === 0) {
+                list.innerHTML = '<li>No free time on this date.</li>';
+            }
+            windows.forEach(function(window) {
+                const item = document.createElement('li');
+                item.textContent = window[0] + ' - ' + window[1];
+                list.appendChild(item);
+            });
+        });
 }
 
 // Function to collect and display messages (e.g., error messages or reservation confirmation)
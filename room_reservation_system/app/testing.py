@@ -0,0 +1,32 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import db
+
+
+class QueryLog(list):
+    def __str__(self):
+        return '\n'.join(f'  {i}. {" ".join(statement.split())}' for i, statement in enumerate(self, 1))
+
+
+# Records every SQL statement the current app's engine executes inside the
+# block, e.g. to see what a request costs:
+#
+#   with count_queries() as queries:
+#       client.get('/reservations')
+#   print(len(queries), queries)
+@contextmanager
+def count_queries():
+    queries = QueryLog()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
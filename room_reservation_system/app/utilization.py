@@ -0,0 +1,203 @@
+import time as clock
+from datetime import date, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+from app.availability import to_minutes
+
+
+def hour_spans(start, end):
+    # (hour, booked minutes) for every clock hour [start, end) reaches into.
+    first, last = to_minutes(start), to_minutes(end)
+    for hour in range(first // 60, -(-last // 60)):
+        yield hour, min(last, (hour + 1) * 60) - max(first, hour * 60)
+
+
+def _deltas(bookings, sign):
+    totals = {}
+    for room_id, day, start, end in bookings:
+        for hour, minutes in hour_spans(start, end):
+            key = (day, room_id, hour)
+            totals[key] = totals.get(key, 0) + sign * minutes
+    return [{'date': day, 'room_id': room_id, 'hour': hour, 'booked_minutes': minutes}
+            for (day, room_id, hour), minutes in totals.items() if minutes]
+
+
+def _apply(rows):
+    from app.models import RoomUtilization
+
+    if not rows:
+        return
+    table = RoomUtilization.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.date, table.c.room_id, table.c.hour],
+            set_={'booked_minutes': table.c.booked_minutes + statement.excluded.booked_minutes},
+        )
+        db.session.execute(statement, rows)
+        return
+    for row in rows:
+        updated = db.session.execute(
+            table.update()
+            .where(table.c.date == row['date'], table.c.room_id == row['room_id'], table.c.hour == row['hour'])
+            .values(booked_minutes=table.c.booked_minutes + row['booked_minutes'])
+        ).rowcount
+        if not updated:
+            db.session.execute(table.insert(), row)
+
+
+# Keep room_utilization in step with bookings. Callers pass (room_id, date,
+# start, end) tuples and commit together with the booking change, so the
+# rollups are never ahead of or behind the reservation table.
+def book(bookings):
+    _apply(_deltas(bookings, 1))
+
+
+def unbook(bookings):
+    _apply(_deltas(bookings, -1))
+
+
+def _booked_rows(first_day, last_day):
+    # Every booking that counts towards utilization: live reservations and
+    # archived ones that were not canceled.
+    from app.models import Reservation, ReservationHistory
+
+    for model in (Reservation, ReservationHistory):
+        yield from db.session.execute(
+            db.select(model.room_id, model.date, model.time, model.end_time)
+            .where(model.canceled == False, model.date.between(first_day, last_day))
+        )
+
+
+def _date_range(first_day, last_day):
+    # Once `flask archive purge` has deleted old history, the rollups are the
+    # only record of those bookings. The range therefore starts no earlier
+    # than the oldest reservation still kept in either table, nor before the
+    # HISTORY_RETENTION_DAYS cutoff, so check() cannot report purged days as
+    # out of date and backfill() cannot wipe them. Empty when there are no
+    # reservations left to count from.
+    from app.models import Reservation, ReservationHistory, RoomUtilization
+
+    bounds = [
+        db.session.execute(db.select(db.func.min(model.date), db.func.max(model.date))).one()
+        for model in (Reservation, ReservationHistory, RoomUtilization)
+    ]
+    lows = [low for low, _ in bounds[:2] if low is not None]
+    highs = [high for _, high in bounds if high is not None]
+    if not lows:
+        return date.today(), date.today() - timedelta(days=1)
+    floor = min(lows)
+    days = current_app.config['HISTORY_RETENTION_DAYS']
+    if days is not None:
+        floor = max(floor, date.today() - timedelta(days=days))
+    return max(first_day or floor, floor), last_day or max(highs)
+
+
+def _chunks(first_day, last_day, days):
+    while first_day <= last_day:
+        yield first_day, min(first_day + timedelta(days=days - 1), last_day)
+        first_day += timedelta(days=days)
+
+
+def backfill(first_day=None, last_day=None, chunk_days=None):
+    from app.models import RoomUtilization
+
+    table = RoomUtilization.__table__
+    first_day, last_day = _date_range(first_day, last_day)
+    rows = 0
+    for low, high in _chunks(first_day, last_day, chunk_days or current_app.config['UTILIZATION_CHUNK_DAYS']):
+        # Deleting first takes the write lock before the base tables are read,
+        # so no booking can commit between the read and the rewrite.
+        db.session.execute(table.delete().where(table.c.date.between(low, high)))
+        totals = _deltas(_booked_rows(low, high), 1)
+        if totals:
+            db.session.execute(table.insert(), totals)
+        db.session.commit()
+        rows += len(totals)
+    return rows
+
+
+def check(first_day=None, last_day=None, chunk_days=None):
+    # Recomputes the rollups from the base tables and returns every
+    # (date, room_id, hour, expected, stored) that differs.
+    from app.models import RoomUtilization
+
+    table = RoomUtilization.__table__
+    first_day, last_day = _date_range(first_day, last_day)
+    mismatches = []
+    for low, high in _chunks(first_day, last_day, chunk_days or current_app.config['UTILIZATION_CHUNK_DAYS']):
+        expected = {(row['date'], row['room_id'], row['hour']): row['booked_minutes']
+                    for row in _deltas(_booked_rows(low, high), 1)}
+        stored = {
+            (row.date, row.room_id, row.hour): row.booked_minutes
+            for row in db.session.execute(db.select(table).where(table.c.date.between(low, high)))
+        }
+        for key in sorted(expected.keys() | stored.keys()):
+            if expected.get(key, 0) != stored.get(key, 0):
+                mismatches.append((*key, expected.get(key, 0), stored.get(key, 0)))
+        db.session.rollback()
+    return mismatches
+
+
+def heatmap(room_ids, first_day, last_day):
+    # Booked minutes as a rooms x days x 24 array, read from the rollups only,
+    # so the cost depends on the range asked for and not on how many
+    # reservations there are.
+    import numpy as np
+
+    from app.models import RoomUtilization
+
+    days = (last_day - first_day).days + 1
+    position = {room_id: i for i, room_id in enumerate(room_ids)}
+    grid = np.zeros((len(room_ids), days, 24), dtype=np.int32)
+    rows = db.session.execute(
+        db.select(RoomUtilization.room_id, RoomUtilization.date, RoomUtilization.hour,
+                  RoomUtilization.booked_minutes)
+        .where(RoomUtilization.date.between(first_day, last_day), RoomUtilization.room_id.in_(room_ids))
+    ).all()
+    if rows:
+        rooms, dates, hours, minutes = zip(*rows)
+        first = first_day.toordinal()
+        grid[
+            np.fromiter((position[room_id] for room_id in rooms), dtype=np.intp, count=len(rows)),
+            np.fromiter((day.toordinal() - first for day in dates), dtype=np.intp, count=len(rows)),
+            np.array(hours, dtype=np.intp),
+        ] = minutes
+    return grid
+
+
+utilization_cli = AppGroup('utilization', help='Maintain the room utilization rollups.')
+
+
+@utilization_cli.command('backfill')
+@click.option('--from', 'first_day', type=click.DateTime(['%Y-%m-%d']),
+              help='First day (default and earliest: oldest booking still on record).')
+@click.option('--to', 'last_day', type=click.DateTime(['%Y-%m-%d']), help='Last day (default: latest booking).')
+def backfill_command(first_day, last_day):
+    started = clock.perf_counter()
+    rows = backfill(first_day and first_day.date(), last_day and last_day.date())
+    click.echo(f'Rebuilt {rows} rollup row(s) in {clock.perf_counter() - started:.1f}s.')
+
+
+@utilization_cli.command('check')
+@click.option('--from', 'first_day', type=click.DateTime(['%Y-%m-%d']),
+              help='First day (default and earliest: oldest booking still on record).')
+@click.option('--to', 'last_day', type=click.DateTime(['%Y-%m-%d']), help='Last day (default: latest booking).')
+@click.option('--limit', default=20, show_default=True, help='Mismatches to print.')
+def check_command(first_day, last_day, limit):
+    mismatches = check(first_day and first_day.date(), last_day and last_day.date())
+    for day, room_id, hour, expected, stored in mismatches[:limit]:
+        click.echo(f'{day} room {room_id} {hour:02d}:00  expected {expected} min, stored {stored} min')
+    if mismatches:
+        raise click.ClickException(f'{len(mismatches)} rollup row(s) out of date; '
+                                   f'run `flask utilization backfill`.')
+    click.echo('Rollups match the reservation tables.')
@@ -0,0 +1,137 @@
+from datetime import date
+
+from flask import current_app
+
+from app import db, events, mail, room_catalog, utilization
+
+
+class AlreadyBooked(Exception):
+    pass
+
+
+def _ahead(entry, other):
+    # Condition on `other` being queued before `entry` for a time that
+    # overlaps it in the same room.
+    return db.and_(
+        other.room_id == entry.room_id,
+        other.date == entry.date,
+        other.time < entry.end_time,
+        other.end_time > entry.time,
+        other.id < entry.id,
+    )
+
+
+def join(user_id, room_id, day, start, end):
+    # Queues the user for [start, end) and returns their place (1 is next),
+    # or None when they already wait for WAITLIST_MAX_PER_USER slots. Asking
+    # again for the same start returns the place they already have. Callers
+    # commit; reserve() does so together with the booking attempt that
+    # failed, so a cancellation cannot slip in between and leave the entry
+    # waiting for a slot that is already free. Raises AlreadyBooked when a
+    # live booking of the user's own overlaps the slot: promotion could only
+    # hand them a time they hold already.
+    from app.models import Reservation, WaitlistEntry
+
+    if db.session.scalar(
+        db.select(Reservation.id)
+        .where(Reservation.overlapping(room_id, start, end), Reservation.date == day,
+               Reservation.user_id == user_id)
+        .limit(1)
+    ) is not None:
+        raise AlreadyBooked()
+    entry = db.session.scalar(
+        db.select(WaitlistEntry).filter_by(user_id=user_id, room_id=room_id, date=day, time=start)
+    )
+    if entry is None:
+        waiting = db.session.scalar(
+            db.select(db.func.count()).select_from(WaitlistEntry)
+            .where(WaitlistEntry.user_id == user_id, WaitlistEntry.date >= date.today())
+        )
+        if waiting >= current_app.config['WAITLIST_MAX_PER_USER']:
+            return None
+        entry = WaitlistEntry(user_id=user_id, room_id=room_id, date=day, time=start, end_time=end)
+        db.session.add(entry)
+        db.session.flush()
+    other = db.aliased(WaitlistEntry)
+    return db.session.scalar(db.select(db.func.count()).select_from(other).where(_ahead(entry, other))) + 1
+
+
+def entries(user_id):
+    # The user's upcoming entries with their place in each queue, soonest
+    # first, in one query.
+    from app.models import WaitlistEntry
+
+    other = db.aliased(WaitlistEntry)
+    ahead = db.select(db.func.count()).select_from(other).where(_ahead(WaitlistEntry, other)).scalar_subquery()
+    return db.session.execute(
+        db.select(WaitlistEntry, ahead + 1)
+        .where(WaitlistEntry.user_id == user_id, WaitlistEntry.date >= date.today())
+        .order_by(WaitlistEntry.date, WaitlistEntry.time)
+    ).all()
+
+
+def leave(user_id, entry_id):
+    from app.models import WaitlistEntry
+
+    return db.session.execute(
+        db.delete(WaitlistEntry).where(WaitlistEntry.id == entry_id, WaitlistEntry.user_id == user_id)
+    ).rowcount == 1
+
+
+def promote(freed):
+    # Books waiting users into slots that were just freed, in the caller's
+    # transaction. Entries overlapping a freed (room_id, date, start, end) are
+    # tried in the order they joined, each with reserve()'s guarded insert,
+    # so one that still clashes with another booking keeps its place and the
+    # next one gets a chance. Returns the new bookings as (room_id, date,
+    # start, end) for the caller to occupy in the availability cache once
+    # committed.
+    from app.models import Reservation, User, WaitlistEntry
+
+    if not freed:
+        return []
+    by_day, days_by_room = {}, {}
+    for room_id, day, start, end in freed:
+        by_day.setdefault((room_id, day), []).append((start, end))
+        days_by_room.setdefault(room_id, set()).add(day)
+    # One (room_id = ? AND date IN (...)) per room seeks ix_waitlist_slot; a
+    # (room_id, date) IN (...) row-value test makes SQLite scan the table.
+    candidates = [
+        entry for entry in db.session.execute(
+            db.select(WaitlistEntry.id, WaitlistEntry.user_id, WaitlistEntry.room_id, WaitlistEntry.date,
+                      WaitlistEntry.time, WaitlistEntry.end_time)
+            .where(db.or_(*(
+                db.and_(WaitlistEntry.room_id == room_id, WaitlistEntry.date.in_(sorted(days)))
+                for room_id, days in days_by_room.items()
+            )))
+            .order_by(WaitlistEntry.id)
+        )
+        if any(start < entry.end_time and entry.time < end for start, end in by_day[entry.room_id, entry.date])
+    ]
+    promoted = [
+        entry for entry in candidates
+        if Reservation.insert_if_free(entry.user_id, entry.room_id, entry.date, entry.time, entry.end_time)
+    ]
+    if not promoted:
+        return []
+
+    db.session.execute(db.delete(WaitlistEntry).where(WaitlistEntry.id.in_([entry.id for entry in promoted])))
+    bookings = [(entry.room_id, entry.date, entry.time, entry.end_time) for entry in promoted]
+    utilization.book(bookings)
+    emails = dict(db.session.execute(
+        db.select(User.id, User.email).where(User.id.in_({entry.user_id for entry in promoted}))
+    ).all())
+    for entry, booking in zip(promoted, bookings):
+        room = room_catalog.get_by_id(entry.room_id)
+        events.taken(entry.room_id, room and room.name, *booking[1:])
+        mail.waitlist_promoted(emails.get(entry.user_id), room.name if room else 'your room', *booking[1:])
+    return bookings
+
+
+def purge_expired():
+    # Entries for days that have passed can never be promoted.
+    from app.models import WaitlistEntry
+
+    purged = db.session.execute(db.delete(WaitlistEntry).where(WaitlistEntry.date < date.today())).rowcount
+    db.session.commit()
+    return purged
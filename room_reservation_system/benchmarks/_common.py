@@ -0,0 +1,42 @@
+# _common.py
+#
+# Setup shared by the benchmark scripts. Importing it puts the project root on
+# sys.path, so a script run as `python benchmarks/<script>.py` can import the
+# app and populate.py.
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+
+
+def bench_app(db_path, **config):
+    # An app on the SQLite file at db_path, with the rate limiter off and no
+    # background job thread (it could outlive a temporary database); both can
+    # be turned back on through `config`, which overrides any setting.
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'RATELIMIT_ENABLED': False,
+        'JOBS_WORKERS': 0,
+        **config,
+    })
+
+
+def logged_in_client(app, user_id):
+    # A test client whose session is already logged in as the user, so
+    # benchmarks do not pay for (or measure) a password check.
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def percentile(ordered, fraction):
+    # The value `fraction` of the way through an ascending list; 0.0 if empty.
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
@@ -0,0 +1,151 @@
+# bench_archive.py
+#
+# Shows that archival takes booking and listing latency back to what the live
+# volume alone costs. Seeds a year of reservations (most of them past, some
+# canceled), times /reserve, /reservations and /admin_panel, runs the
+# archival while a client keeps booking (reporting the worst booking latency
+# seen meanwhile, i.e. how long a batch holds the write lock), then times the
+# routes again.
+#
+#   python benchmarks/bench_archive.py --reservations 1000000 --batch-size 1000
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time as clock
+from datetime import date, timedelta
+
+from _common import bench_app, logged_in_client
+
+import populate
+from app import db
+from app.archive import archive_reservations
+from app.availability import slot_time
+from app.models import Reservation, ReservationHistory, Room, User
+
+
+def booking(rng, rooms, first_day):
+    # Each phase books its own future range, so all of them see the same
+    # share of taken slots.
+    return {
+        'room': rng.choice(rooms),
+        'date': (first_day + timedelta(days=rng.randrange(60))).isoformat(),
+        'time': slot_time(rng.randrange(32, 72)).strftime('%H:%M'),
+        'duration': 30,
+    }
+
+
+def timed(fn, count, after=None):
+    latencies = []
+    for _ in range(count):
+        started = clock.perf_counter()
+        fn()
+        latencies.append((clock.perf_counter() - started) * 1000)
+        if after is not None:
+            after()
+    return statistics.median(latencies)
+
+
+def show_flashes(client):
+    # The test client does not follow the redirect after a booking; render a
+    # page as the browser would so flashed messages leave the session.
+    client.get('/reserve')
+
+
+def measure(clients, rng, rooms, requests, first_day):
+    return {
+        'reserve': timed(lambda: clients['booker'].post('/reserve', data=booking(rng, rooms, first_day)),
+                         requests, lambda: show_flashes(clients['booker'])),
+        'reservations': timed(lambda: clients['user'].get('/reservations'), requests),
+        'admin_panel': timed(lambda: clients['admin'].get(f'/admin_panel?from={date.today()}'), requests),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reservation archival.')
+    parser.add_argument('--reservations', type=int, default=300000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--pause', type=float, default=0.0)
+    parser.add_argument('--requests', type=int, default=100, help='timed requests per route')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = bench_app(os.path.join(tmp, 'archive.db'),
+                        PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', WTF_CSRF_ENABLED=False)
+        with app.app_context():
+            db.create_all()
+            populate.create_admin_user()
+            populate.create_users(max(args.reservations // 200, 20), rng, 10000)
+            populate.populate_rooms(max(3, args.reservations // 2000), 10000)
+            # A year of bookings ending two months from now.
+            populate.populate_reservations(args.reservations, 365, date.today() - timedelta(days=305),
+                                           rng, 0.3, 0.1, 10000)
+            rooms = list(db.session.scalars(db.select(Room.name)))
+            admin_id = db.session.scalar(db.select(User.id).filter_by(username='admin'))
+            # The listing user never books during the run, so their list only
+            # shrinks by what archival moves.
+            user_id, booker_id = (
+                db.session.scalar(db.select(User.id).filter_by(username=name))
+                for name in populate.animal_names[:2]
+            )
+        clients = {
+            'admin': logged_in_client(app, admin_id),
+            'user': logged_in_client(app, user_id),
+            'booker': logged_in_client(app, booker_id),
+        }
+
+        def counts():
+            with app.app_context():
+                return (db.session.scalar(db.select(db.func.count()).select_from(Reservation)),
+                        db.session.scalar(db.select(db.func.count()).select_from(ReservationHistory)))
+
+        today = date.today()
+        measure(clients, rng, rooms, 5, today + timedelta(days=100))  # warm caches
+        before_rows = counts()
+        before = measure(clients, rng, rooms, args.requests, today + timedelta(days=200))
+
+        # Book continuously while archiving, from another client.
+        stop = threading.Event()
+        during = []
+
+        def keep_booking():
+            client = logged_in_client(app, booker_id)
+            booking_rng = random.Random(args.seed + 1)
+            while not stop.is_set():
+                started = clock.perf_counter()
+                client.post('/reserve', data=booking(booking_rng, rooms, today + timedelta(days=300)))
+                during.append((clock.perf_counter() - started) * 1000)
+                show_flashes(client)
+
+        booker = threading.Thread(target=keep_booking)
+        booker.start()
+        started = clock.perf_counter()
+        with app.app_context():
+            moved = archive_reservations(batch_size=args.batch_size, pause=args.pause)
+        elapsed = clock.perf_counter() - started
+        stop.set()
+        booker.join()
+
+        after_rows = counts()
+        after = measure(clients, rng, rooms, args.requests, today + timedelta(days=400))
+        with app.app_context():
+            db.engine.dispose()
+
+    print(f'reservation rows: {before_rows[0]} live table before, {after_rows[0]} after '
+          f'({after_rows[1]} in history)')
+    print(f'archived {moved} rows in {elapsed:.1f}s ({moved / elapsed:,.0f} rows/sec), '
+          f'batch size {args.batch_size}')
+    if during:
+        print(f'bookings during archival: {len(during)}, p50={statistics.median(during):.1f} ms, '
+              f'max={max(during):.1f} ms')
+    print(f'{"median ms":<14} {"before":>8} {"after":>8}')
+    for route in before:
+        print(f'{route:<14} {before[route]:>8.2f} {after[route]:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# bench_availability.py
+#
+# Compares slot lookups through the in-memory availability bitmaps against the
+# per-request Reservation query they replace, at several table sizes, and
+# times the vectorized month-long availability grid for every room.
+#
+#   python benchmarks/bench_availability.py --sizes 10000 100000 1000000
+import argparse
+import os
+import random
+import tempfile
+import time as clock
+from datetime import date, timedelta
+
+from _common import bench_app
+
+from app import db, availability
+from app.availability import SLOTS_PER_DAY, free_windows, occupancy_grid, slot_time
+from app.models import User, Room, Reservation
+
+ROOMS = 100
+BATCH = 50000
+
+
+def seed(size, rng):
+    db.session.add(User(username='bench', email='bench@example.com'))
+    db.session.add_all(Room(name=f'Room {i}') for i in range(1, ROOMS + 1))
+    db.session.commit()
+
+    # Unique (room, day, slot) triples, so the partial unique index holds.
+    days = size // (ROOMS * SLOTS_PER_DAY) + 1
+    first_day = date(2030, 1, 1)
+    cells = rng.sample(range(ROOMS * days * SLOTS_PER_DAY), size)
+    for offset in range(0, size, BATCH):
+        batch = []
+        for cell in cells[offset:offset + BATCH]:
+            cell, slot = divmod(cell, SLOTS_PER_DAY)
+            day, room = divmod(cell, ROOMS)
+            batch.append({
+                'user_id': 1,
+                'room_id': room + 1,
+                'date': first_day + timedelta(days=day),
+                'time': slot_time(slot),
+                'canceled': False,
+            })
+        db.session.execute(db.insert(Reservation), batch)
+    db.session.commit()
+    return first_day, days
+
+
+def timed(fn, probes):
+    started = clock.perf_counter()
+    for probe in probes:
+        fn(*probe)
+    return (clock.perf_counter() - started) / len(probes) * 1e6
+
+
+def query_is_free(room_id, day, start):
+    return Reservation.query.filter_by(
+        room_id=room_id, date=day, time=start, canceled=False
+    ).first() is None
+
+
+def query_free_slots(room_id, day, start):
+    taken = {
+        row.time for row in db.session.query(Reservation.time).filter_by(
+            room_id=room_id, date=day, canceled=False
+        )
+    }
+    return [slot_time(slot) for slot in range(SLOTS_PER_DAY) if slot_time(slot) not in taken]
+
+
+def run(size, lookups, rng):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = bench_app(os.path.join(tmp, 'bench.db'), TESTING=True)
+        with app.app_context():
+            db.create_all()
+            first_day, days = seed(size, rng)
+            probes = [
+                (rng.randint(1, ROOMS),
+                 first_day + timedelta(days=rng.randrange(days)),
+                 slot_time(rng.randrange(SLOTS_PER_DAY)))
+                for _ in range(lookups)
+            ]
+
+            started = clock.perf_counter()
+            availability.load()
+            load_ms = (clock.perf_counter() - started) * 1000
+
+            result = {
+                'size': size,
+                'load_ms': load_ms,
+                'query_is_free_us': timed(query_is_free, probes),
+                'bitmap_is_free_us': timed(availability.is_free, probes),
+                'query_free_slots_us': timed(query_free_slots, probes),
+                'bitmap_free_slots_us': timed(lambda r, d, t: availability.free_slots(r, d), probes),
+            }
+
+            started = clock.perf_counter()
+            grid = occupancy_grid(list(range(1, ROOMS + 1)), first_day, first_day + timedelta(days=30))
+            free_windows(grid)
+            result['month_grid_ms'] = (clock.perf_counter() - started) * 1000
+            db.engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f'{"rows":>9} {"load ms":>9} {"is_free query":>14} {"is_free bitmap":>15} '
+          f'{"free_slots query":>17} {"free_slots bitmap":>18} {"month grid ms":>14}   (us/op)')
+    for size in args.sizes:
+        r = run(size, args.lookups, random.Random(args.seed))
+        print(f'{r["size"]:>9} {r["load_ms"]:>9.1f} {r["query_is_free_us"]:>14.1f} '
+              f'{r["bitmap_is_free_us"]:>15.2f} {r["query_free_slots_us"]:>17.1f} '
+              f'{r["bitmap_free_slots_us"]:>18.2f} {r["month_grid_ms"]:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# bench_bulk_cancel.py
+#
+# Clears a room for an event: cancels every reservation of one room over a
+# date range, once with a POST to /admin/cancel_reservation per reservation
+# (plus the admin panel page the browser loads after each redirect) and once
+# with a single call to the bulk endpoint, and checks both leave the
+# utilization rollups consistent.
+#
+#   python benchmarks/bench_bulk_cancel.py --reservations 500
+import argparse
+import os
+import sys
+import tempfile
+import time as clock
+from datetime import date, time, timedelta
+
+from _common import bench_app, logged_in_client
+
+from app import db, utilization
+from app.models import Reservation, Room, User
+
+
+def seed(app, count, first_day):
+    # Two rooms with the same bookings; one is cleared each way.
+    with app.app_context():
+        rooms = [Room(name='One by one'), Room(name='Bulk')]
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        user = User(username='user', email='user@example.com')
+        db.session.add_all(rooms + [admin, user])
+        db.session.flush()
+        rows = []
+        for room in rooms:
+            for i in range(count):
+                day = first_day + timedelta(days=i // 40)
+                start = time(8 + i % 40 // 4, i % 4 * 15)
+                rows.append(Reservation(user_id=user.id, room_id=room.id, date=day, time=start,
+                                        end_time=time(start.hour, start.minute + 14)))
+        db.session.add_all(rows)
+        db.session.commit()
+        utilization.backfill()
+        return admin.id, [room.id for room in rooms]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk cancellation.')
+    parser.add_argument('--reservations', type=int, default=500, help='reservations to cancel each way')
+    args = parser.parse_args()
+
+    first_day = date.today() + timedelta(days=30)
+    last_day = first_day + timedelta(days=args.reservations // 40)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = bench_app(os.path.join(tmp, 'cancel.db'), WTF_CSRF_ENABLED=False)
+        with app.app_context():
+            db.create_all()
+        admin_id, (single_room, bulk_room) = seed(app, args.reservations, first_day)
+        admin = logged_in_client(app, admin_id)
+
+        with app.app_context():
+            ids = list(db.session.scalars(db.select(Reservation.id).filter_by(room_id=single_room)))
+        started = clock.perf_counter()
+        for reservation_id in ids:
+            admin.post('/admin/cancel_reservation', data={'reservation_id': reservation_id})
+            admin.get('/admin_panel')
+        one_by_one = clock.perf_counter() - started
+
+        started = clock.perf_counter()
+        response = admin.post('/admin/reservations/cancel', json={
+            'room': bulk_room, 'from': first_day.isoformat(), 'to': last_day.isoformat(),
+        })
+        bulk = clock.perf_counter() - started
+        canceled = response.get_json()['canceled']
+
+        with app.app_context():
+            mismatches = utilization.check()
+            db.engine.dispose()
+
+    print(f'one by one: {len(ids)} requests in {one_by_one * 1000:.0f} ms')
+    print(f'bulk:       {canceled} canceled in one request, {bulk * 1000:.1f} ms '
+          f'({one_by_one / bulk:.0f}x faster)')
+    print(f'rollups: {"consistent" if not mismatches else f"{len(mismatches)} mismatches"}')
+    if mismatches or canceled != len(ids):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# bench_events.py
+#
+# Opens many /events streams, books rooms from another client and measures
+# how long a slot-taken event takes to reach every subscriber, with the local
+# or the database backend. For comparison it times /availability, which each
+# browser would otherwise poll, and prints the request rate polling would
+# cost for the same number of clients.
+#
+#   python benchmarks/bench_events.py --subscribers 200 --bookings 100 --backend database
+import argparse
+import os
+import tempfile
+import threading
+import time as clock
+from datetime import date, timedelta
+
+from _common import bench_app, logged_in_client, percentile
+
+from app import db, events
+from app.models import Room, User
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark availability event fan-out.')
+    parser.add_argument('--subscribers', type=int, default=200)
+    parser.add_argument('--bookings', type=int, default=100)
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--backend', choices=['local', 'database'], default='local')
+    parser.add_argument('--poll-interval', type=float, default=5.0,
+                        help='seconds between reloads for the polling comparison')
+    args = parser.parse_args()
+
+    day = date.today() + timedelta(days=7)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = bench_app(
+            os.path.join(tmp, 'events.db'),
+            WTF_CSRF_ENABLED=False,
+            EVENTS_BACKEND=args.backend,
+            EVENTS_POLL_INTERVAL=0.05,
+            EVENTS_HEARTBEAT=1,
+            EVENTS_MAX_SUBSCRIBERS=None,
+        )
+        with app.app_context():
+            db.create_all()
+            db.session.add_all(Room(name=f'Room {i + 1}') for i in range(args.rooms))
+            db.session.add(User(username='booker', email='booker@example.com'))
+            db.session.commit()
+            user_id = db.session.scalar(db.select(User.id))
+
+        received = {}
+        lock = threading.Lock()
+        ready = threading.Barrier(args.subscribers + 1)
+
+        def subscribe(i):
+            client = logged_in_client(app, user_id)
+            response = client.get(f'/events?room=Room {i % args.rooms + 1}&from={day}', buffered=False)
+            chunks = iter(response.response)
+            next(chunks)  # the opening comment: subscribed
+            ready.wait()
+            for chunk in chunks:
+                now = clock.perf_counter()
+                for line in chunk.decode().splitlines():
+                    if line.startswith('id: '):
+                        with lock:
+                            received.setdefault((i % args.rooms, line), []).append(now)
+
+        app.config['EVENTS_MAX_STREAM'] = 3600
+        listeners = [threading.Thread(target=subscribe, args=(i,), daemon=True) for i in range(args.subscribers)]
+        for listener in listeners:
+            listener.start()
+        ready.wait()
+
+        booker = logged_in_client(app, user_id)
+        committed = []
+        for n in range(args.bookings):
+            room = n % args.rooms
+            started = clock.perf_counter()
+            booker.post('/reserve', data={
+                'room': f'Room {room + 1}', 'date': day.isoformat(),
+                'time': f'{n // args.rooms // 4:02d}:{n // args.rooms % 4 * 15:02d}', 'duration': 15,
+            })
+            committed.append((room, started))
+            booker.get('/reserve')  # drop the flashed message
+        clock.sleep(1)
+
+        expected = args.subscribers // args.rooms
+        latencies, missing = [], 0
+        with lock:
+            by_room = {}
+            for (room, event_id), times in received.items():
+                by_room.setdefault(room, []).append(times)
+        for room, started in committed:
+            batches = by_room.get(room) or [[]]
+            times = batches.pop(0)
+            missing += expected - len(times)
+            latencies.extend((t - started) * 1000 for t in times)
+
+        client = logged_in_client(app, user_id)
+        started = clock.perf_counter()
+        for _ in range(50):
+            client.get(f'/availability?room=Room 1&from={day}')
+        poll_ms = (clock.perf_counter() - started) * 1000 / 50
+
+        with app.app_context():
+            subscribers = events.subscribers()
+            db.engine.dispose()
+
+    latencies.sort()
+    print(f'{args.subscribers} subscribers ({subscribers} open at the end), {args.bookings} bookings, '
+          f'{args.backend} backend')
+    print(f'delivery from booking start: p50={percentile(latencies, 0.5):.1f} ms '
+          f'p99={percentile(latencies, 0.99):.1f} ms max={latencies[-1]:.1f} ms, {missing} missed')
+    print(f'polling instead: {args.subscribers / args.poll_interval:.0f} req/s of /availability '
+          f'at {poll_ms:.2f} ms each = {args.subscribers / args.poll_interval * poll_ms / 1000:.2f} '
+          f'CPU-seconds per second, and free slots seen up to {args.poll_interval:.0f}s late')
+
+
+if __name__ == '__main__':
+    main()
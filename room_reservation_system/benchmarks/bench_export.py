@@ -0,0 +1,108 @@
+# bench_export.py
+#
+# Measures throughput (rows/sec) and peak RSS of the streaming reservation
+# export. The dataset is generated in a child process so the parent's peak
+# RSS reflects the export alone.
+#
+#   python benchmarks/bench_export.py --rows 100000 1000000 --format csv ndjson
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time as clock
+from datetime import date, timedelta
+
+from _common import bench_app
+
+from app import db
+from app.availability import SLOTS_PER_DAY, slot_time
+from app.models import User, Room, Reservation
+
+ROOMS = 50
+BATCH = 50000
+
+
+def build_app(db_path):
+    return bench_app(db_path, TESTING=True)
+
+
+def seed(db_path, rows):
+    app = build_app(db_path)
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', is_admin=True)
+        db.session.add(admin)
+        db.session.add_all(Room(name=f'Room {i}') for i in range(1, ROOMS + 1))
+        db.session.commit()
+
+        first_day = date(2030, 1, 1)
+        for offset in range(0, rows, BATCH):
+            batch = []
+            for cell in range(offset, min(offset + BATCH, rows)):
+                cell, slot = divmod(cell, SLOTS_PER_DAY)
+                day, room = divmod(cell, ROOMS)
+                batch.append({
+                    'user_id': admin.id,
+                    'room_id': room + 1,
+                    'date': first_day + timedelta(days=day),
+                    'time': slot_time(slot),
+                })
+            db.session.execute(db.insert(Reservation), batch)
+        db.session.commit()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export(db_path, export_format):
+    app = build_app(db_path)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+
+    rss_before = peak_rss_mb()
+    started = clock.perf_counter()
+    response = client.get(f'/admin/export?format={export_format}', buffered=False)
+    size = lines = 0
+    for chunk in response.response:
+        size += len(chunk)
+        lines += chunk.count(b'\n')
+    response.close()
+    elapsed = clock.perf_counter() - started
+
+    rows = lines - 1 if export_format == 'csv' else lines
+    return rows, size, elapsed, rss_before, peak_rss_mb()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--format', nargs='+', default=['csv', 'ndjson'], choices=['csv', 'ndjson'])
+    parser.add_argument('--seed-only', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed_only:
+        seed(args.seed_only, args.rows[0])
+        return
+
+    print(f'{"rows":>9} {"format":>7} {"MB":>8} {"seconds":>8} {"rows/sec":>10} {"peak RSS MB":>12}')
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'export.db')
+            subprocess.run(
+                [sys.executable, __file__, '--seed-only', db_path, '--rows', str(rows)],
+                check=True,
+            )
+            for export_format in args.format:
+                exported, size, elapsed, rss_before, rss_after = export(db_path, export_format)
+                assert exported == rows, (exported, rows)
+                print(f'{rows:>9} {export_format:>7} {size / 1e6:>8.1f} {elapsed:>8.2f} '
+                      f'{rows / elapsed:>10.0f} {rss_after:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
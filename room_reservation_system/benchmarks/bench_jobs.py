@@ -0,0 +1,102 @@
+# bench_jobs.py
+#
+# Sends password reset emails through the job queue to a local SMTP sink and
+# compares the request latency with sending the same mail inline. Reports
+# job latency (enqueue to delivery) and retries, and fails unless every
+# message is eventually delivered.
+#
+#   python benchmarks/bench_jobs.py --emails 200 --workers 4 --fail-rate 0.2 --smtp-delay 0.1
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time as clock
+
+from _common import bench_app, percentile
+
+from smtp_sink import SMTPSink
+from app import db, jobs
+from app.mail import send_email
+from app.models import Job, User
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark queued email delivery.')
+    parser.add_argument('--emails', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2, help='JOBS_WORKERS')
+    parser.add_argument('--fail-rate', type=float, default=0.2, help='share of SMTP sends refused')
+    parser.add_argument('--smtp-delay', type=float, default=0.1, help='simulated mail server latency (s)')
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    sink = SMTPSink(fail_rate=args.fail_rate, delay=args.smtp_delay, seed=42).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        app = bench_app(
+            os.path.join(tmp, 'jobs.db'),
+            TESTING=True,
+            WTF_CSRF_ENABLED=False,
+            MAIL_SERVER='127.0.0.1',
+            MAIL_PORT=sink.port,
+            JOBS_WORKERS=args.workers,
+            JOBS_MAX_ATTEMPTS=10,
+            JOBS_BACKOFF_BASE=0.05,
+            JOBS_POLL_INTERVAL=0.1,
+        )
+        with app.app_context():
+            db.create_all()
+            db.session.add_all(User(username=f'user{i}', email=f'user{i}@example.com')
+                               for i in range(args.emails))
+            db.session.commit()
+
+        client = app.test_client()
+        queued = []
+        for i in range(args.emails):
+            started = clock.perf_counter()
+            response = client.post('/reset_password', data={'email': f'user{i}@example.com'})
+            queued.append(clock.perf_counter() - started)
+            assert response.status_code == 302, response.status_code
+
+        deadline = clock.monotonic() + args.timeout
+        with app.app_context():
+            while clock.monotonic() < deadline:
+                counts = jobs.counts()
+                if not counts['pending'] and not counts['running']:
+                    break
+                clock.sleep(0.1)
+            jobs.stop()
+
+            done = db.session.scalars(db.select(Job).filter_by(status='done')).all()
+            failed = counts['failed']
+            latencies = sorted((job.finished_at - job.created_at).total_seconds() for job in done)
+            retries = sum(job.attempts - 1 for job in done)
+
+            sink.fail_rate = 0.0
+            inline = []
+            for i in range(min(args.emails, 20)):
+                started = clock.perf_counter()
+                send_email(f'user{i}@example.com', 'Inline', 'Sent from the request thread.')
+                inline.append(clock.perf_counter() - started)
+            db.engine.dispose()
+    sink.stop()
+
+    queued.sort()
+    inline.sort()
+    print(f'{args.emails} reset emails, {args.workers} worker thread(s), fail rate {args.fail_rate}, '
+          f'SMTP delay {args.smtp_delay * 1000:.0f} ms')
+    print(f'request with queued email: p50={statistics.median(queued) * 1000:.2f} ms '
+          f'p95={percentile(queued, 0.95) * 1000:.2f} ms')
+    print(f'inline SMTP send alone:    p50={statistics.median(inline) * 1000:.2f} ms '
+          f'p95={percentile(inline, 0.95) * 1000:.2f} ms')
+    print(f'delivered {len(done)}, failed {failed}, retries {retries}, refused by sink {sink.refused}')
+    if latencies:
+        print(f'job latency: p50={statistics.median(latencies) * 1000:.1f} ms '
+              f'p95={percentile(latencies, 0.95) * 1000:.1f} ms max={latencies[-1] * 1000:.1f} ms')
+    if len(done) != args.emails:
+        print('FAIL: not every email was delivered')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
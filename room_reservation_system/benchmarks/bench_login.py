@@ -0,0 +1,82 @@
+# bench_login.py
+#
+# Measures login throughput (logins/sec) and latency with N concurrent
+# clients, for a given hash scheme and hashing pool size.
+#
+#   python benchmarks/bench_login.py --clients 16 --logins 200 --workers 4 \
+#       --method pbkdf2:sha256:600000
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time as clock
+
+from _common import bench_app
+
+from app import db
+from app.models import User
+
+
+def login_loop(app, username, count, latencies, errors):
+    client = app.test_client()
+    for _ in range(count):
+        started = clock.perf_counter()
+        response = client.post('/login', data={'username': username, 'password': 'benchmark'})
+        latencies.append(clock.perf_counter() - started)
+        if response.status_code != 302:
+            errors.append(response.status_code)
+        client.get('/logout')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=100, help='total logins across all clients')
+    parser.add_argument('--workers', type=int, default=0, help='PASSWORD_HASH_WORKERS (0 hashes inline)')
+    parser.add_argument('--method', default='pbkdf2:sha256:600000')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = bench_app(
+            os.path.join(tmp, 'login.db'),
+            TESTING=True,
+            WTF_CSRF_ENABLED=False,
+            PASSWORD_HASH_METHOD=args.method,
+            PASSWORD_HASH_WORKERS=args.workers,
+            PASSWORD_HASH_MAX_PENDING=max(args.clients, 1),
+        )
+        with app.app_context():
+            db.create_all()
+            for i in range(args.clients):
+                user = User(username=f'bench{i}', email=f'bench{i}@example.com')
+                user.set_password('benchmark')
+                db.session.add(user)
+            db.session.commit()
+
+        latencies, errors = [], []
+        per_client = max(args.logins // args.clients, 1)
+        threads = [
+            threading.Thread(target=login_loop, args=(app, f'bench{i}', per_client, latencies, errors))
+            for i in range(args.clients)
+        ]
+        started = clock.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = clock.perf_counter() - started
+        with app.app_context():
+            db.engine.dispose()
+
+    latencies.sort()
+    print(f'method={args.method} workers={args.workers} clients={args.clients}')
+    print(f'{len(latencies)} logins in {elapsed:.2f}s: {len(latencies) / elapsed:.1f} logins/sec, '
+          f'{len(errors)} errors')
+    print(f'latency ms: p50={statistics.median(latencies) * 1000:.1f} '
+          f'p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} '
+          f'max={latencies[-1] * 1000:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# bench_metrics.py
+#
+# Measures the overhead of request and SQL instrumentation: the same
+# requests are timed against two apps on one database, one with
+# METRICS_ENABLED and one without, in alternating rounds.
+#
+#   python benchmarks/bench_metrics.py --requests 2000 --rounds 5
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time as clock
+
+from _common import bench_app, logged_in_client
+
+import populate
+from app import db
+from app.models import User
+
+PATHS = ['/reservations', '/reserve', '/admin_panel']
+
+
+def build_app(db_path, enabled):
+    return bench_app(db_path, PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', METRICS_ENABLED=enabled)
+
+
+def timed_round(clients, requests):
+    started = clock.perf_counter()
+    for i in range(requests):
+        path = PATHS[i % len(PATHS)]
+        client = clients['admin'] if path == '/admin_panel' else clients['user']
+        response = client.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path}: HTTP {response.status_code}')
+    return (clock.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the overhead of /metrics instrumentation.')
+    parser.add_argument('--reservations', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=2000, help='timed requests per round')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'metrics.db')
+        apps = {enabled: build_app(db_path, enabled) for enabled in (False, True)}
+        rng = random.Random(args.seed)
+        with apps[False].app_context():
+            db.create_all()
+            populate.create_admin_user()
+            populate.create_users(max(args.reservations // 10, 20), rng, 10000)
+            populate.populate_rooms(max(3, args.reservations // 200), 10000)
+            populate.populate_reservations(args.reservations, 28, populate.date(2030, 1, 7), rng,
+                                           0.3, 0.08, 10000)
+            admin_id = db.session.scalar(db.select(User.id).filter_by(username='admin'))
+            user_id = db.session.scalar(db.select(User.id).filter_by(username=populate.animal_names[0]))
+
+        clients = {
+            enabled: {'admin': logged_in_client(app, admin_id), 'user': logged_in_client(app, user_id)}
+            for enabled, app in apps.items()
+        }
+        for enabled in apps:
+            timed_round(clients[enabled], len(PATHS) * 10)  # warm caches
+
+        timings = {False: [], True: []}
+        for _ in range(args.rounds):
+            for enabled in (False, True):
+                timings[enabled].append(timed_round(clients[enabled], args.requests))
+
+        for app in apps.values():
+            with app.app_context():
+                db.engine.dispose()
+
+    off = statistics.median(timings[False])
+    on = statistics.median(timings[True])
+    print(f'{args.requests} requests x {args.rounds} rounds over {", ".join(PATHS)}')
+    print(f'metrics off: {off:8.1f} us/request (median of rounds)')
+    print(f'metrics on:  {on:8.1f} us/request (median of rounds)')
+    print(f'overhead:    {(on - off) / off * 100:+.2f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# bench_ratelimit.py
+#
+# A script floods /login with wrong passwords from one address while a
+# regular user logs in from another. Reports how much worker time the flood
+# takes and how long the regular logins wait, with the rate limiter off and
+# on, plus the limiter's cost on a cheap page (the cached /explore).
+#
+#   python benchmarks/bench_ratelimit.py --flood 200 --method pbkdf2:sha256:600000
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time as clock
+
+from _common import bench_app
+
+from app import db, password_hasher
+from app.models import User
+
+
+def client_from(app, address):
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = address
+    return client
+
+
+def flood(app, attempts):
+    # Returns (seconds spent, responses refused with 429).
+    client = client_from(app, '203.0.113.7')
+    refused = 0
+    started = clock.perf_counter()
+    for _ in range(attempts):
+        response = client.post('/login', data={'username': 'victim', 'password': 'guess'})
+        refused += response.status_code == 429
+    return clock.perf_counter() - started, refused
+
+
+def regular_logins(app, count, latencies, stop):
+    client = client_from(app, '198.51.100.1')
+    while len(latencies) < count and not stop.is_set():
+        started = clock.perf_counter()
+        response = client.post('/login', data={'username': 'regular', 'password': 'benchmark'})
+        latencies.append(clock.perf_counter() - started)
+        if response.status_code != 302:
+            raise RuntimeError(f'regular login: HTTP {response.status_code}')
+        client.get('/logout')
+
+
+def page_cost(apps, requests, rounds):
+    # Alternates between the apps so drift on the machine hits both alike;
+    # returns the median us/request of each.
+    clients = {enabled: client_from(app, '198.51.100.2') for enabled, app in apps.items()}
+    timings = {enabled: [] for enabled in apps}
+    for client in clients.values():
+        client.get('/explore')
+    for _ in range(rounds):
+        for enabled, client in clients.items():
+            started = clock.perf_counter()
+            for _ in range(requests):
+                client.get('/explore')
+            timings[enabled].append((clock.perf_counter() - started) / requests * 1e6)
+    return {enabled: statistics.median(values) for enabled, values in timings.items()}
+
+
+def build_app(tmp, enabled, args):
+    app = bench_app(
+        os.path.join(tmp, f'ratelimit-{enabled}.db'),
+        RATELIMIT_ENABLED=enabled,
+        WTF_CSRF_ENABLED=False,
+        PASSWORD_HASH_METHOD=args.method,
+        # The page-cost check makes more requests than a person would.
+        RATELIMIT_RULES={'default': {'ip': (10 ** 9, 10 ** 6), 'user': (10 ** 9, 10 ** 6)},
+                         'main.login': {'ip': (30, 10), 'user': (10, 5)}},
+    )
+    with app.app_context():
+        db.create_all()
+        for name in ('victim', 'regular'):
+            user = User(username=name, email=f'{name}@example.com')
+            user.password_hash = password_hasher.hash('benchmark')
+            db.session.add(user)
+        db.session.commit()
+    return app
+
+
+def under_flood(app, args):
+    latencies, stop = [], threading.Event()
+    regular = threading.Thread(target=regular_logins, args=(app, args.regular, latencies, stop))
+    regular.start()
+    spent, refused = flood(app, args.flood)
+    stop.set()
+    regular.join()
+    return spent, refused, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the rate limiter against a login flood.')
+    parser.add_argument('--flood', type=int, default=200, help='wrong-password attempts')
+    parser.add_argument('--regular', type=int, default=5, help='regular logins at most (within the login burst)')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per round for the page cost')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--method', default='pbkdf2:sha256:600000')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        apps = {enabled: build_app(tmp, enabled, args) for enabled in (False, True)}
+        results = {enabled: under_flood(app, args) for enabled, app in apps.items()}
+        costs = page_cost(apps, args.requests, args.rounds)
+        for app in apps.values():
+            with app.app_context():
+                db.engine.dispose()
+
+    print(f'{args.flood} wrong-password attempts from one address, {args.method}')
+    for enabled, (spent, refused, latency) in results.items():
+        print(f'limiter {"on " if enabled else "off"}: flood took {spent:6.2f} s, {refused:4d} refused with 429; '
+              f'regular login median {latency * 1000:6.0f} ms; /explore {costs[enabled]:5.0f} us/request')
+
+if __name__ == '__main__':
+    main()
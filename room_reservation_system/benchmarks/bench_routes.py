@@ -0,0 +1,363 @@
+# bench_routes.py
+#
+# End-to-end latency and throughput of the booking routes (/login, /reserve,
+# /reservations, /admin_panel and /admin/cancel_reservation) against datasets
+# of several sizes generated with populate.py. Requests go through the Flask
+# test client, or over HTTP to --workers local server processes; CSRF stays
+# on in both modes and tokens are read from the rendered forms. Results are
+# written as JSON so runs can be compared across commits.
+#
+#   python benchmarks/bench_routes.py --sizes 1000 10000 100000 --concurrency 4
+#   python benchmarks/bench_routes.py --workers 4 --output before.json
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import tempfile
+import threading
+import time as clock
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, namedtuple
+from datetime import date, timedelta
+
+from _common import bench_app, percentile
+
+import populate
+from app import db
+from app.availability import slot_time
+from app.models import Room, Reservation
+
+FIRST_DAY = date(2030, 1, 7)
+DAYS = 28
+ADMIN = ('admin', 'hackersdobem')
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+# who: the account each client logs in as before the timed requests start.
+# ok: status codes counted as success (a taken slot re-renders the form).
+Route = namedtuple('Route', ['name', 'who', 'send', 'after', 'ok'])
+
+
+class ClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_data(as_text=True)
+
+    def post(self, path, data):
+        response = self.client.post(path, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(), _NoRedirect())
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read().decode()
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, data):
+        body = urllib.parse.urlencode(data).encode()
+        return self._open(urllib.request.Request(self.base_url + path, data=body))
+
+
+def fetch_token(session, path):
+    status, body = session.get(path)
+    match = CSRF_TOKEN.search(body)
+    if match is None:
+        raise RuntimeError(f'no CSRF token on {path} (HTTP {status})')
+    session.token = match.group(1)
+
+
+def post_login(session):
+    return session.post('/login', {
+        'username': session.credentials[0],
+        'password': session.credentials[1],
+        'csrf_token': session.token,
+    })[0]
+
+
+def log_in(session, credentials):
+    session.credentials = credentials
+    fetch_token(session, '/login')
+    if post_login(session) != 302:
+        raise RuntimeError(f'could not log in as {credentials[0]}')
+
+
+def log_out(session):
+    session.get('/logout')
+
+
+def show_flashes(session):
+    # Redirects are not followed; render a page as the browser would, so
+    # flashed messages leave the session instead of piling up in the cookie.
+    session.get('/reserve')
+
+
+def send_reserve(session, job):
+    room, day, start = job
+    return session.post('/reserve', {
+        'room': room,
+        'date': day.isoformat(),
+        'time': start,
+        'duration': 60,
+        'csrf_token': session.token,
+    })[0]
+
+
+def send_cancel(session, reservation_id):
+    return session.post('/admin/cancel_reservation', {
+        'reservation_id': reservation_id,
+        'csrf_token': session.token,
+    })[0]
+
+
+# Read-only routes run before the ones that write.
+ROUTES = [
+    Route('login', 'anonymous', lambda session, job: post_login(session), log_out, {302}),
+    Route('reservations', 'user', lambda session, job: session.get('/reservations')[0], None, {200}),
+    Route('admin_panel', 'admin', lambda session, job: session.get('/admin_panel')[0], None, {200}),
+    Route('reserve', 'user', send_reserve, show_flashes, {200, 302}),
+    Route('cancel_reservation', 'admin', send_cancel, show_flashes, {302}),
+]
+
+
+def user_credentials(index):
+    # Synthetic populate.py users follow the named ones.
+    return f'user{len(populate.animal_names) + index:08d}', populate.SYNTHETIC_PASSWORD
+
+
+def seed(app, size, concurrency, rng):
+    users = max(size // 10, len(populate.animal_names) + concurrency)
+    rooms = max(3, size // 200)
+    with app.app_context():
+        db.create_all()
+        populate.create_admin_user()
+        populate.create_users(users, rng, 10000)
+        populate.populate_rooms(rooms, 10000)
+        populate.populate_reservations(size, DAYS, FIRST_DAY, rng, 0.3, 0.08, 10000)
+        room_names = list(db.session.scalars(db.select(Room.name)))
+        live_ids = list(db.session.scalars(db.select(Reservation.id).filter_by(canceled=False)))
+        reservations = db.session.scalar(db.select(db.func.count(Reservation.id)))
+        db.engine.dispose()
+    return {'users': users, 'rooms': rooms, 'reservations': reservations}, room_names, live_ids
+
+
+def make_jobs(route, count, rng, room_names, live_ids):
+    if route.name == 'reserve':
+        return [
+            (rng.choice(room_names),
+             FIRST_DAY + timedelta(days=rng.randrange(DAYS)),
+             slot_time(rng.randrange(8 * 4, 18 * 4)).strftime('%H:%M'))
+            for _ in range(count)
+        ]
+    if route.name == 'cancel_reservation':
+        return rng.sample(live_ids, min(count, len(live_ids)))
+    return [None] * count
+
+
+def run_route(route, new_session, jobs, concurrency):
+    sessions = []
+    for index in range(concurrency):
+        session = new_session(index)
+        if route.who == 'anonymous':
+            session.credentials = user_credentials(index)
+            fetch_token(session, '/login')
+        else:
+            log_in(session, ADMIN if route.who == 'admin' else user_credentials(index))
+            if route.name == 'reserve':
+                fetch_token(session, '/reserve')
+        sessions.append(session)
+
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(session, share):
+        timings, codes = [], Counter()
+        barrier.wait()
+        for job in share:
+            started = clock.perf_counter()
+            status = route.send(session, job)
+            timings.append(clock.perf_counter() - started)
+            codes[status] += 1
+            if route.after is not None:
+                route.after(session)
+        with lock:
+            latencies.extend(timings)
+            statuses.update(codes)
+
+    threads = [
+        threading.Thread(target=worker, args=(session, jobs[index::concurrency]))
+        for index, session in enumerate(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = clock.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = clock.perf_counter() - started
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': sum(n for status, n in statuses.items() if status not in route.ok),
+        'statuses': {str(status): n for status, n in sorted(statuses.items())},
+        'throughput_rps': count / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'mean': sum(latencies) / count * 1000 if count else 0.0,
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p90': percentile(latencies, 0.90) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'max': latencies[-1] * 1000 if count else 0.0,
+        },
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(app, port):
+    from werkzeug.serving import run_simple
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    run_simple('127.0.0.1', port, app, threaded=True)
+
+
+def start_servers(app, workers):
+    # One long-lived process per worker, like a prefork server, so each keeps
+    # its own warm caches. Clients are spread over them round-robin.
+    context = multiprocessing.get_context('fork')
+    ports = [free_port() for _ in range(workers)]
+    processes = [context.Process(target=serve, args=(app, port), daemon=True) for port in ports]
+    for process in processes:
+        process.start()
+    deadline = clock.monotonic() + 15
+    for port in ports:
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if clock.monotonic() > deadline:
+                    raise RuntimeError(f'server on port {port} did not start')
+                clock.sleep(0.05)
+    return ports, processes
+
+
+def run_size(size, args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        config = {'PASSWORD_HASH_METHOD': args.hash_method} if args.hash_method else {}
+        app = bench_app(os.path.join(tmp, 'bench.db'), **config)
+        dataset, room_names, live_ids = seed(app, size, args.concurrency, rng)
+
+        processes = []
+        if args.workers:
+            ports, processes = start_servers(app, args.workers)
+            new_session = lambda index: HttpSession(f'http://127.0.0.1:{ports[index % len(ports)]}')
+        else:
+            new_session = lambda index: ClientSession(app)
+
+        routes = {}
+        try:
+            for route in ROUTES:
+                if args.routes and route.name not in args.routes:
+                    continue
+                count = args.login_requests if route.name == 'login' else args.requests
+                jobs = make_jobs(route, count, rng, room_names, live_ids)
+                routes[route.name] = run_route(route, new_session, jobs, args.concurrency)
+                print(format_row(size, route.name, routes[route.name]))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
+            with app.app_context():
+                db.engine.dispose()
+    return {'size': size, 'dataset': dataset, 'routes': routes}
+
+
+def format_row(size, name, result):
+    latency = result['latency_ms']
+    return (f'{size:>9} {name:<19} {result["requests"]:>6} {result["errors"]:>6} '
+            f'{result["throughput_rps"]:>9.1f} {latency["p50"]:>8.2f} {latency["p95"]:>8.2f} '
+            f'{latency["p99"]:>8.2f} {latency["max"]:>8.2f}')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the booking routes end to end.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='reservations in each generated dataset')
+    parser.add_argument('--requests', type=int, default=500, help='timed requests per route')
+    parser.add_argument('--login-requests', type=int, default=50,
+                        help='timed logins (each one hashes a password)')
+    parser.add_argument('--concurrency', type=int, default=1, help='concurrent clients')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='serve over HTTP from this many local processes (0 uses the test client)')
+    parser.add_argument('--routes', nargs='+', choices=[route.name for route in ROUTES])
+    parser.add_argument('--hash-method', help='PASSWORD_HASH_METHOD override')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_routes.json')
+    args = parser.parse_args()
+
+    print(f'{"size":>9} {"route":<19} {"reqs":>6} {"errors":>6} {"req/s":>9} '
+          f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}')
+    results = [run_size(size, args) for size in args.sizes]
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'mode': f'http x{args.workers}' if args.workers else 'test_client',
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'login_requests': args.login_requests,
+        'hash_method': args.hash_method,
+        'seed': args.seed,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
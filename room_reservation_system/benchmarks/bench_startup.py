@@ -0,0 +1,76 @@
+# bench_startup.py
+#
+# Cold start of a worker: starts fresh interpreters that import the app,
+# build it with create_app() and serve their first requests (the login page
+# and the explore page, which render templates), and reports the median time
+# of each step. Runs without the template bytecode cache, with an empty one
+# and with one filled by an earlier run.
+#
+#   python benchmarks/bench_startup.py --runs 15
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from _common import ROOT
+
+WORKER = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(json.loads(sys.argv[1]))
+created = time.perf_counter()
+client = app.test_client()
+client.get('/login')
+client.get('/explore')
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first requests': served - created, 'total': served - started}))
+'''
+
+
+def run(config, runs, before=None):
+    samples = []
+    for _ in range(runs):
+        if before is not None:
+            before()
+        output = subprocess.run([sys.executable, '-c', WORKER, json.dumps(config)], cwd=ROOT,
+                                check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output.splitlines()[-1]))
+    return {step: statistics.median(sample[step] for sample in samples) * 1000 for step in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark worker cold start.')
+    parser.add_argument('--runs', type=int, default=15)
+    args = parser.parse_args()
+
+    from app import create_app
+    from app.database import upgrade_schema
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = f'sqlite:///{os.path.join(tmp, "startup.db")}'
+        upgrade_schema(create_app({'SQLALCHEMY_DATABASE_URI': database, 'TEMPLATE_BYTECODE_CACHE': False}))
+        cache = os.path.join(tmp, 'jinja_cache')
+        config = {'SQLALCHEMY_DATABASE_URI': database, 'JOBS_WORKERS': 0, 'TEMPLATE_CACHE_DIR': cache}
+
+        results = {
+            'no template cache': run({**config, 'TEMPLATE_BYTECODE_CACHE': False}, args.runs),
+            'empty cache': run(config, args.runs, lambda: shutil.rmtree(cache, ignore_errors=True)),
+            'warm cache': run(config, args.runs),
+        }
+
+    steps = list(next(iter(results.values())))
+    print(f'median ms over {args.runs} runs')
+    print(f'{"":<18}' + ''.join(f'{step:>16}' for step in steps))
+    for name, result in results.items():
+        print(f'{name:<18}' + ''.join(f'{result[step]:>16.1f}' for step in steps))
+
+
+if __name__ == '__main__':
+    main()
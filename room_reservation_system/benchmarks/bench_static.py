@@ -0,0 +1,79 @@
+# bench_static.py
+#
+# Measures what a logged-out page view costs with and without the page cache
+# (full render, cached copy, and a 304 revalidation), and the bytes sent for
+# the stylesheet and script plain, gzip- and brotli-encoded after
+# `flask assets build`. The build is made in a temporary copy of the static
+# folder so the working tree is left alone.
+#
+#   python benchmarks/bench_static.py --requests 2000
+import argparse
+import os
+import shutil
+import tempfile
+import time as clock
+
+from _common import bench_app
+
+from app import db
+from app.assets import build
+
+
+def per_view(app, path, count):
+    # The view alone, without the framework's per-request work around it.
+    view = app.view_functions[app.url_map.bind('').match(path)[0]]
+    with app.test_request_context(path):
+        view()
+        started = clock.perf_counter()
+        for _ in range(count):
+            view()
+    return (clock.perf_counter() - started) / count * 1e6
+
+
+def per_request(client, path, count, headers=None):
+    started = clock.perf_counter()
+    for _ in range(count):
+        client.get(path, headers=headers or {}).close()
+    return (clock.perf_counter() - started) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark page caching and static assets.')
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for ttl in (0, 300):
+            app = bench_app(os.path.join(tmp, 'static.db'), PAGE_CACHE_TTL=ttl)
+            with app.app_context():
+                db.create_all()
+            client = app.test_client()
+            for path in ('/', '/explore'):
+                response = client.get(path)
+                etag = response.headers.get('ETag')
+                results[(path, ttl)] = per_request(client, path, args.requests)
+                results[(path, ttl, 'view')] = per_view(app, path, args.requests)
+                if ttl:
+                    results[(path, '304')] = per_request(client, path, args.requests, {'If-None-Match': etag})
+
+        static = os.path.join(tmp, 'static')
+        shutil.copytree(app.static_folder, static, ignore=shutil.ignore_patterns('build'))
+        manifest = build(static)
+
+        print(f'{"page":<10} {"render us":>10} {"cached us":>10} {"304 us":>8} {"view render":>12} {"view cached":>12}')
+        for path in ('/', '/explore'):
+            print(f'{path:<10} {results[(path, 0)]:>10.0f} {results[(path, 300)]:>10.0f} '
+                  f'{results[(path, "304")]:>8.0f} {results[(path, 0, "view")]:>12.0f} '
+                  f'{results[(path, 300, "view")]:>12.0f}')
+        print(f'\n{"asset":<16} {"plain":>8} {"gzip":>8} {"br":>8}')
+        for name, hashed in sorted(manifest['files'].items()):
+            path = os.path.join(static, hashed)
+            sizes = [os.path.getsize(path)] + [
+                os.path.getsize(path + suffix) if os.path.exists(path + suffix) else None for suffix in ('.gz', '.br')
+            ]
+            print(f'{name:<16} ' + ' '.join(f'{size:>8}' if size else f'{"-":>8}' for size in sizes))
+
+
+if __name__ == '__main__':
+    main()
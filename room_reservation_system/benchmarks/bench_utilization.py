@@ -0,0 +1,112 @@
+# bench_utilization.py
+#
+# Times the utilization heatmap endpoint, which reads the room_utilization
+# rollups, against computing the same numbers from the reservation tables, as
+# the booking history grows while the number of rooms and the booking density
+# stay fixed. Also reports how long a backfill and a consistency check take,
+# and the /reserve latency with rollup upkeep.
+#
+#   python benchmarks/bench_utilization.py --history-days 90 365 1460 --rooms 20
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time as clock
+from datetime import date, timedelta
+
+from _common import bench_app, logged_in_client
+
+import populate
+from app import db, utilization
+from app.availability import slot_time
+from app.models import Room, User
+
+
+def timed(fn, count):
+    latencies = []
+    for _ in range(count):
+        started = clock.perf_counter()
+        fn()
+        latencies.append((clock.perf_counter() - started) * 1000)
+    return statistics.median(latencies)
+
+
+def run(days, room_count, density, window, requests, seed):
+    rng = random.Random(seed)
+    size = days * room_count * density
+    with tempfile.TemporaryDirectory() as tmp:
+        app = bench_app(os.path.join(tmp, 'utilization.db'),
+                        PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', WTF_CSRF_ENABLED=False)
+        first_day = date.today() - timedelta(days=days - 60)
+        with app.app_context():
+            db.create_all()
+            populate.create_admin_user()
+            populate.create_users(max(size // 200, 20), rng, 10000)
+            populate.populate_rooms(room_count, 10000)
+            populate.populate_reservations(size, days, first_day, rng, 0.3, 0.1, 10000)
+            rooms = list(db.session.scalars(db.select(Room.name)))
+            admin_id = db.session.scalar(db.select(User.id).filter_by(username='admin'))
+            booker_id = db.session.scalar(db.select(User.id).filter_by(username=populate.animal_names[0]))
+
+            started = clock.perf_counter()
+            utilization.backfill()
+            backfill = clock.perf_counter() - started
+            started = clock.perf_counter()
+            mismatches = len(utilization.check())
+            check = clock.perf_counter() - started
+
+            last_day = date.today()
+            low = last_day - timedelta(days=window - 1)
+            room_ids = list(db.session.scalars(db.select(Room.id)))
+
+            def from_base_tables():
+                # What the report would cost without rollups.
+                utilization._deltas(utilization._booked_rows(low, last_day), 1)
+                db.session.rollback()
+
+            base = timed(from_base_tables, max(3, requests // 10))
+            rollup_read = timed(lambda: utilization.heatmap(room_ids, low, last_day), requests)
+
+        admin = logged_in_client(app, admin_id)
+        booker = logged_in_client(app, booker_id)
+        url = f'/admin/analytics/utilization?from={low}&to={last_day}'
+        endpoint = timed(lambda: admin.get(url), requests)
+        reserve = timed(lambda: booker.post('/reserve', data={
+            'room': rng.choice(rooms),
+            'date': (date.today() + timedelta(days=100 + rng.randrange(60))).isoformat(),
+            'time': slot_time(rng.randrange(32, 72)).strftime('%H:%M'),
+            'duration': 60,
+        }), requests)
+        with app.app_context():
+            db.engine.dispose()
+    return {
+        'days': days, 'size': size, 'backfill_s': backfill, 'check_s': check,
+        'mismatches': mismatches, 'base_ms': base, 'rollup_ms': rollup_read,
+        'endpoint_ms': endpoint, 'reserve_ms': reserve,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark utilization rollups.')
+    parser.add_argument('--history-days', type=int, nargs='+', default=[90, 365, 1460])
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--density', type=int, default=6, help='bookings per room per day')
+    parser.add_argument('--window', type=int, default=28, help='days covered by the heatmap')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f'{"days":>6} {"reservations":>12} {"backfill s":>10} {"check s":>8} '
+          f'{"scan ms":>9} {"rollup ms":>9} {"endpoint ms":>11} {"reserve ms":>10}')
+    for days in args.history_days:
+        result = run(days, args.rooms, args.density, args.window, args.requests, args.seed)
+        print(f'{result["days"]:>6} {result["size"]:>12} {result["backfill_s"]:>10.1f} '
+              f'{result["check_s"]:>8.1f} {result["base_ms"]:>9.1f} {result["rollup_ms"]:>9.2f} '
+              f'{result["endpoint_ms"]:>11.2f} {result["reserve_ms"]:>10.2f}')
+        if result['mismatches']:
+            print(f'  {result["mismatches"]} rollup rows did not match after backfill')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# bench_waitlist.py
+#
+# Many users want one slot that is taken and freed after a while. Without
+# the waitlist they resubmit /reserve every tick until one of them gets it;
+# with it each joins once and the cancellation books the first in line. Reports
+# requests, SQL statements and time spent on both, and checks the slot went
+# to exactly one user.
+#
+#   python benchmarks/bench_waitlist.py --users 50 --ticks 20
+import argparse
+import os
+import sys
+import tempfile
+import time as clock
+from datetime import date, timedelta
+
+from _common import bench_app, logged_in_client
+
+from app import db
+from app.models import Reservation, Room, User
+from app.testing import count_queries
+
+
+def run(app, clients, admin, form, ticks, use_waitlist):
+    # Returns (requests, statements, seconds, reservations of the slot).
+    with app.app_context():
+        db.session.execute(db.delete(Reservation))
+        db.session.commit()
+    admin.post('/reserve', data=form)
+    with app.app_context():
+        held = db.session.scalar(db.select(Reservation.id).filter_by(canceled=False))
+    requests = 0
+    with app.app_context(), count_queries() as queries:
+        started = clock.perf_counter()
+        waiting = list(clients)
+        for tick in range(ticks + 1):
+            if tick == ticks:
+                admin.post('/admin/cancel_reservation', data={'reservation_id': held})
+                requests += 1
+            if use_waitlist and tick:
+                continue
+            for client in list(waiting):
+                response = client.post('/reserve', data={**form, 'waitlist': 'y'} if use_waitlist else form)
+                requests += 1
+                if response.status_code == 302 and not use_waitlist:
+                    waiting.remove(client)
+        elapsed = clock.perf_counter() - started
+    with app.app_context():
+        booked = db.session.scalar(db.select(db.func.count()).select_from(Reservation).filter_by(canceled=False))
+    return requests, len(queries), elapsed, booked
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark retrying a taken slot against the waitlist.')
+    parser.add_argument('--users', type=int, default=50, help='users who want the slot')
+    parser.add_argument('--ticks', type=int, default=20, help='retry rounds before the slot is freed')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = bench_app(os.path.join(tmp, 'waitlist.db'), WTF_CSRF_ENABLED=False)
+        with app.app_context():
+            db.create_all()
+            admin = User(username='admin', email='admin@example.com', is_admin=True)
+            users = [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(args.users)]
+            db.session.add_all([Room(name='Room 1'), admin] + users)
+            db.session.commit()
+            admin_id, user_ids = admin.id, [user.id for user in users]
+        admin = logged_in_client(app, admin_id)
+        clients = [logged_in_client(app, user_id) for user_id in user_ids]
+        form = {'room': 'Room 1', 'date': (date.today() + timedelta(days=7)).isoformat(),
+                'time': '10:00', 'duration': 60}
+
+        results = {
+            'retrying': run(app, clients, admin, form, args.ticks, False),
+            'waitlist': run(app, clients, admin, form, args.ticks, True),
+        }
+        with app.app_context():
+            db.engine.dispose()
+
+    print(f'{args.users} users, slot freed after {args.ticks} rounds')
+    for name, (requests, statements, elapsed, booked) in results.items():
+        print(f'{name:<9} {requests:>6} requests {statements:>7} statements {elapsed * 1000:>8.0f} ms'
+              f'   slot held by {booked} user(s)')
+    if any(booked != 1 for *_, booked in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
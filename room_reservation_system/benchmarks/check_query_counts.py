@@ -0,0 +1,108 @@
+# check_query_counts.py
+#
+# Guards the listing routes against N+1 queries: each route is requested
+# with a growing number of rows on the page and must stay within a fixed
+# SQL statement budget however many rows it renders. Prints the statements
+# of any route over budget and exits non-zero.
+#
+#   python benchmarks/check_query_counts.py --rows 1 50 500
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+from _common import bench_app, logged_in_client
+
+from app import db, identity_cache, room_catalog
+from app.availability import SLOTS_PER_DAY, slot_time
+from app.models import User, Room, Reservation
+from app.testing import count_queries
+
+ROOMS = 5
+FIRST_DAY = date(2030, 1, 7)
+DAY_SLOTS = SLOTS_PER_DAY - 1  # every booking must end the same day
+
+# Budgets include loading the user on a cold identity cache and the room
+# catalog, which later requests get from memory.
+BUDGETS = {
+    '/reservations': ('user', 3),  # user, reservations with rooms, waitlist places
+    '/admin_panel?per_page=500': ('admin', 3),
+    '/admin/export?format=csv': ('admin', 2),
+    '/admin/export?format=ndjson': ('admin', 2),
+    f'/availability?from={FIRST_DAY}&to={FIRST_DAY + timedelta(days=30)}': ('user', 3),
+}
+
+
+def seed(rows):
+    admin = User(username='admin', email='admin@example.com', is_admin=True)
+    user = User(username='user', email='user@example.com')
+    db.session.add_all([admin, user])
+    db.session.add_all(Room(name=f'Room {i}') for i in range(1, ROOMS + 1))
+    db.session.commit()
+    db.session.execute(db.insert(Reservation.__table__), [
+        {
+            'user_id': user.id,
+            'room_id': i % ROOMS + 1,
+            'date': FIRST_DAY + timedelta(days=i // (ROOMS * DAY_SLOTS)),
+            'time': slot_time(i // ROOMS % DAY_SLOTS),
+            'end_time': slot_time(i // ROOMS % DAY_SLOTS + 1),
+            'canceled': False,
+        }
+        for i in range(rows)
+    ])
+    db.session.commit()
+    return {'admin': admin.id, 'user': user.id}
+
+
+def check(rows):
+    failures = []
+    counts = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = bench_app(os.path.join(tmp, 'queries.db'), TESTING=True)
+        with app.app_context():
+            db.create_all()
+            user_ids = seed(rows)
+            db.session.remove()
+            for path, (who, budget) in BUDGETS.items():
+                identity_cache.invalidate(user_ids.values())
+                room_catalog.invalidate()
+                client = logged_in_client(app, user_ids[who])
+                with count_queries() as queries:
+                    response = client.get(path)
+                    response.get_data()
+                if response.status_code != 200:
+                    failures.append(f'{path}: HTTP {response.status_code}')
+                counts[path] = len(queries)
+                if len(queries) > budget:
+                    failures.append(f'{path} with {rows} rows ran {len(queries)} statements '
+                                    f'(budget {budget}):\n{queries}')
+            db.engine.dispose()
+    return counts, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check SQL statement budgets of the listing routes.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 50, 500])
+    args = parser.parse_args()
+
+    failures = []
+    print(f'{"route":<58} ' + ' '.join(f'{rows:>6}' for rows in args.rows) + '  budget')
+    results = []
+    for rows in args.rows:
+        counts, route_failures = check(rows)
+        results.append(counts)
+        failures.extend(route_failures)
+    for path, (who, budget) in BUDGETS.items():
+        print(f'{path:<58} ' + ' '.join(f'{counts[path]:>6}' for counts in results) + f'  {budget:>6}')
+
+    if failures:
+        print('\nFAIL')
+        for failure in failures:
+            print(failure)
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
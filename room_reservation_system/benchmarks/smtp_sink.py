@@ -0,0 +1,122 @@
+# smtp_sink.py
+#
+# A local SMTP stand-in that accepts and counts messages without delivering
+# them, optionally refusing a share of them with a temporary error so job
+# retries get exercised. Run it on its own and point MAIL_SERVER/MAIL_PORT at
+# it, or start it from a script with SMTPSink(...).start(). --delay stands in
+# for the round trips of a remote mail server.
+#
+#   python benchmarks/smtp_sink.py --port 1025 --fail-rate 0.2 --delay 0.2 --print
+import argparse
+import random
+import socketserver
+import threading
+import time as clock
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        sink = self.server.sink
+        self.reply('220 smtp-sink ready')
+        recipients, data = [], None
+        for raw in self.rfile:
+            if data is not None:
+                if raw in (b'.\r\n', b'.\n'):
+                    clock.sleep(sink.delay)
+                    if sink.refuse():
+                        self.reply('451 try again later')
+                    else:
+                        sink.deliver(recipients, b''.join(data))
+                        self.reply('250 queued')
+                    recipients, data = [], None
+                else:
+                    data.append(raw[1:] if raw.startswith(b'..') else raw)
+                continue
+            command = raw.decode(errors='replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 smtp-sink')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 ok')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip(' <>'))
+                self.reply('250 ok')
+            elif verb == 'DATA':
+                data = []
+                self.reply('354 end data with <CR><LF>.<CR><LF>')
+            elif verb in ('RSET', 'NOOP'):
+                recipients = []
+                self.reply('250 ok')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SMTPSink:
+    def __init__(self, host='127.0.0.1', port=0, fail_rate=0.0, delay=0.0, echo=False, seed=None):
+        self.server = _Server((host, port), _Handler)
+        self.server.sink = self
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.echo = echo
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.refused = 0
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def refuse(self):
+        with self.lock:
+            if self.rng.random() < self.fail_rate:
+                self.refused += 1
+                return True
+            return False
+
+    def deliver(self, recipients, message):
+        with self.lock:
+            self.messages.append((recipients, message))
+        if self.echo:
+            print(f'--- to {", ".join(recipients)}\n{message.decode(errors="replace")}')
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Accept SMTP messages locally without delivering them.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of messages refused with 451')
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before answering a message')
+    parser.add_argument('--print', dest='echo', action='store_true', help='print every message')
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.host, args.port, args.fail_rate, args.delay, args.echo)
+    print(f'Listening on {args.host}:{sink.port}; Ctrl-C to stop.')
+    try:
+        sink.server.serve_forever()
+    except KeyboardInterrupt:
+        print(f'{len(sink.messages)} message(s) accepted, {sink.refused} refused.')
+
+
+if __name__ == '__main__':
+    main()
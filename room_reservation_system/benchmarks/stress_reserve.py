@@ -0,0 +1,92 @@
+# stress_reserve.py
+#
+# Fires many concurrent bookings at a single room slot and checks that the
+# database lets exactly one of them through. With --staggered the clients ask
+# for overlapping hour-long ranges starting 10:00, 10:15, 10:30 and 10:45.
+#
+#   python benchmarks/stress_reserve.py --clients 50 [--staggered]
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from datetime import date
+
+from _common import bench_app
+
+from app import db
+from app.models import User, Room, Reservation
+
+
+def build_app(db_path):
+    app = bench_app(db_path, TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed(app, clients):
+    with app.app_context():
+        db.session.add(Room(name='Room 1'))
+        users = [User(username=f'stress{i}', email=f'stress{i}@example.com') for i in range(clients)]
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+
+
+def book(app, user_id, start, duration, barrier, results, index):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    barrier.wait()
+    response = client.post('/reserve', data={
+        'room': 'Room 1',
+        'date': '2030-01-07',
+        'time': start,
+        'duration': duration,
+    })
+    # A successful booking redirects home; a taken slot re-renders the form.
+    results[index] = response.status_code == 302
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--staggered', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, 'stress.db'))
+        user_ids = seed(app, args.clients)
+
+        barrier = threading.Barrier(args.clients)
+        results = [False] * args.clients
+        threads = [
+            threading.Thread(target=book, args=(
+                app, user_id,
+                f'10:{15 * (i % 4):02d}' if args.staggered else '10:00',
+                60 if args.staggered else 15,
+                barrier, results, i,
+            ))
+            for i, user_id in enumerate(user_ids)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with app.app_context():
+            live = Reservation.query.filter_by(date=date(2030, 1, 7), canceled=False).count()
+            db.engine.dispose()
+
+    accepted = sum(results)
+    print(f'{args.clients} concurrent bookings: {accepted} accepted, {live} live reservation(s)')
+    if accepted != 1 or live != 1:
+        print('FAIL: expected exactly one booking to succeed')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,92 @@
 import os
 
+from sqlalchemy.pool import StaticPool
+
+
+def _database_url(default):
+    url = os.getenv('DATABASE_URL', default)
+    # Some hosts still hand out the scheme SQLAlchemy 1.4 dropped.
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
 class Config:
-    SECRET_KEY = os.getenv('SECRET_KEY')  # Read from .env file
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///site.db'
+    SECRET_KEY = os.getenv('SECRET_KEY', 'your-default-secret-key')  # Read from .env file
+    SQLALCHEMY_DATABASE_URI = _database_url('sqlite:///site.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    # Applied to every new SQLite connection (ignored for other databases).
+    # WAL lets readers run alongside a writer, busy_timeout makes a writer wait
+    # for the lock instead of failing with "database is locked", and
+    # synchronous=NORMAL only fsyncs at checkpoints, which is safe under WAL.
+    SQLITE_PRAGMAS = {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negative: KiB rather than pages
+    }
+    TEMPLATE_BYTECODE_CACHE = True
+    TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR')  # default: instance/jinja_cache
+    ADMIN_PAGE_SIZE = 50
+    ADMIN_MAX_PAGE_SIZE = 500
+    EXPORT_BATCH_SIZE = 1000
+    RECURRING_MAX_OCCURRENCES = 52
+    AVAILABILITY_MAX_DAYS = 62
+    # Live reservations this many days in the past, and canceled ones of any
+    # age, are moved to reservation_history by `flask archive run`.
+    ARCHIVE_AFTER_DAYS = 30
+    ARCHIVE_BATCH_SIZE = 1000
+    ARCHIVE_PAUSE = 0.05  # seconds between batches, for other writers
+    HISTORY_RETENTION_DAYS = None  # keep history forever
+    BULK_CANCEL_MAX_IDS = 5000
+    WAITLIST_MAX_PER_USER = 20
+    PROXY_FIX_X_FOR = int(os.getenv('PROXY_FIX_X_FOR', 0))  # reverse proxies in front of the app
+    # /metrics names endpoints and traffic, so it is only served to a scraper
+    # holding METRICS_TOKEN ("Authorization: Bearer <token>"); without one,
+    # metrics stay off unless a profile or FLASK_METRICS_ENABLED turns them on.
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_ENABLED = bool(METRICS_TOKEN)
+    RATELIMIT_BACKEND = os.getenv('RATELIMIT_BACKEND', 'memory')
+    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL')  # e.g. redis://localhost:6379/0
+    ANALYTICS_MAX_DAYS = 366
+    UTILIZATION_CHUNK_DAYS = 31  # days rebuilt or checked per transaction
+    MAIL_SERVER = os.getenv('MAIL_SERVER')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 25))
+    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', '').lower() in ('1', 'true', 'yes')
+    MAIL_USERNAME = os.getenv('MAIL_USERNAME')
+    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'reservations@example.com')
+    MAIL_TIMEOUT = 10
+
+
+class ProductionConfig(Config):
+    # Pool sizing matters for a server database such as PostgreSQL; each
+    # worker process gets its own pool of DB_POOL_SIZE + DB_MAX_OVERFLOW.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+
+
+class TestingConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    # One in-memory database shared by every thread through a single
+    # connection; it disappears with the engine.
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': StaticPool,
+        'connect_args': {'check_same_thread': False},
+    }
+    SQLITE_PRAGMAS = {}
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    JOBS_WORKERS = 0
+    TEMPLATE_BYTECODE_CACHE = False
+    RATELIMIT_ENABLED = False
+    METRICS_ENABLED = True
@@ -0,0 +1,35 @@
+"""reservation no overlap
+
+Revision ID: 1e5b8c3a7d46
+Revises: 9c3e7a1d5f28
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1e5b8c3a7d46'
+down_revision = '9c3e7a1d5f28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # PostgreSQL only: SQLite serializes writers, so the guarded insert is
+    # enough there.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute(
+        'ALTER TABLE reservation ADD CONSTRAINT reservation_no_overlap EXCLUDE USING gist ('
+        'room_id WITH =, tsrange(date + "time", date + end_time) WITH &&'
+        ') WHERE (NOT canceled)'
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('ALTER TABLE reservation DROP CONSTRAINT reservation_no_overlap')
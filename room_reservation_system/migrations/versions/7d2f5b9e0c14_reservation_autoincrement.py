@@ -0,0 +1,65 @@
+"""reservation autoincrement
+
+Revision ID: 7d2f5b9e0c14
+Revises: 4f8a2d6c1b95
+Create Date: 2026-10-19 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2f5b9e0c14'
+down_revision = '4f8a2d6c1b95'
+branch_labels = None
+depends_on = None
+
+LIVE_INDEXES = [
+    ('uq_reservation_active_slot', ['room_id', 'date', 'time'], True),
+    ('ix_reservation_live_date_time', ['date', 'time', 'id'], False),
+    ('ix_reservation_live_user_date_time', ['user_id', 'date', 'time', 'id'], False),
+]
+HIGHEST_ID = ('SELECT max(coalesce((SELECT max(id) FROM reservation), 0), '
+              'coalesce((SELECT max(id) FROM reservation_history), 0))')
+
+
+def _rebuild(autoincrement):
+    # SQLite can only change AUTOINCREMENT by copying the table. The batch
+    # copy would lose the partial indexes' WHERE clauses, so they are
+    # dropped first and recreated afterwards.
+    for name, _, _ in LIVE_INDEXES:
+        op.drop_index(name, table_name='reservation')
+    with op.batch_alter_table('reservation', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+    for name, columns, unique in LIVE_INDEXES:
+        op.create_index(
+            name, 'reservation', columns,
+            unique=unique,
+            sqlite_where=sa.text('canceled = 0'),
+            postgresql_where=sa.text('NOT canceled'),
+        )
+
+
+def upgrade():
+    # Other databases never hand out an id twice.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    # Without AUTOINCREMENT, SQLite reuses the ids of archived rows, and those
+    # rows then cannot be archived next to the originals in
+    # reservation_history. Move any such row past every id in use.
+    highest = op.get_bind().execute(sa.text(HIGHEST_ID)).scalar()
+    op.execute(sa.text(
+        'UPDATE reservation SET id = id + :highest WHERE id IN (SELECT id FROM reservation_history)'
+    ).bindparams(highest=highest))
+    _rebuild(True)
+    # New ids start above every id in either table.
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'reservation'")
+    op.execute(f"INSERT INTO sqlite_sequence (name, seq) SELECT 'reservation', ({HIGHEST_ID})")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _rebuild(False)
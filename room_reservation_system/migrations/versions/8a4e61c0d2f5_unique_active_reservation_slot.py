@@ -0,0 +1,50 @@
+"""unique active reservation slot
+
+Revision ID: 8a4e61c0d2f5
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e61c0d2f5'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the oldest live booking of any slot that was double-booked before
+    # the index existed; the others are canceled so the index can be built.
+    reservation = sa.table(
+        'reservation',
+        sa.column('id', sa.Integer),
+        sa.column('room_id', sa.Integer),
+        sa.column('date', sa.Date),
+        sa.column('time', sa.Time),
+        sa.column('canceled', sa.Boolean),
+    )
+    keep = (
+        sa.select(sa.func.min(reservation.c.id))
+        .where(reservation.c.canceled == sa.false())
+        .group_by(reservation.c.room_id, reservation.c.date, reservation.c.time)
+    )
+    op.execute(
+        reservation.update()
+        .where(reservation.c.canceled == sa.false())
+        .where(reservation.c.id.not_in(keep))
+        .values(canceled=True)
+    )
+    op.create_index(
+        'uq_reservation_active_slot', 'reservation', ['room_id', 'date', 'time'],
+        unique=True,
+        sqlite_where=sa.text('canceled = 0'),
+        postgresql_where=sa.text('NOT canceled'),
+    )
+
+
+def downgrade():
+    op.drop_index('uq_reservation_active_slot', table_name='reservation')
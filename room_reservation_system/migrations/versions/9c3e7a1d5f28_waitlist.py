@@ -0,0 +1,42 @@
+"""waitlist
+
+Revision ID: 9c3e7a1d5f28
+Revises: 6b2d9f4e1a73
+Create Date: 2026-10-18 19:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e7a1d5f28'
+down_revision = '6b2d9f4e1a73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('waitlist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('room_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('time', sa.Time(), nullable=False),
+    sa.Column('end_time', sa.Time(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['room_id'], ['room.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('waitlist', schema=None) as batch_op:
+        batch_op.create_index('ix_waitlist_slot', ['room_id', 'date', 'time', 'id'], unique=False)
+        batch_op.create_index('uq_waitlist_user_slot', ['user_id', 'room_id', 'date', 'time'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('waitlist', schema=None) as batch_op:
+        batch_op.drop_index('uq_waitlist_user_slot')
+        batch_op.drop_index('ix_waitlist_slot')
+
+    op.drop_table('waitlist')
@@ -0,0 +1,45 @@
+"""reservation history
+
+Revision ID: b3e8c1f4a902
+Revises: a91f6d2c7e48
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8c1f4a902'
+down_revision = 'a91f6d2c7e48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reservation_history',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('time', sa.Time(), nullable=False),
+    sa.Column('end_time', sa.Time(), nullable=False),
+    sa.Column('canceled', sa.Boolean(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('room_id', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['room_id'], ['room.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('reservation_history', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_history_date_time', ['date', 'time', 'id'], unique=False)
+        batch_op.create_index('ix_reservation_history_room_date', ['room_id', 'date'], unique=False)
+        batch_op.create_index('ix_reservation_history_user_date', ['user_id', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_history_user_date')
+        batch_op.drop_index('ix_reservation_history_room_date')
+        batch_op.drop_index('ix_reservation_history_date_time')
+
+    op.drop_table('reservation_history')
@@ -0,0 +1,81 @@
+"""reservation end time
+
+Revision ID: c52d9e3b41a7
+Revises: 8a4e61c0d2f5
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+from datetime import time
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52d9e3b41a7'
+down_revision = '8a4e61c0d2f5'
+branch_labels = None
+depends_on = None
+
+SLOT_MINUTES = 15
+BATCH_SIZE = 5000
+
+reservation = sa.table(
+    'reservation',
+    sa.column('id', sa.Integer),
+    sa.column('room_id', sa.Integer),
+    sa.column('date', sa.Date),
+    sa.column('time', sa.Time),
+    sa.column('end_time', sa.Time),
+    sa.column('canceled', sa.Boolean),
+)
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _backfill(bind):
+    # Every existing row was a single 15-minute slot. Live rows are walked in
+    # (room, date, time) order and clipped at the next live start, so that
+    # rows 10:00 and 10:05 do not come out overlapping.
+    rows = bind.execute(
+        sa.select(reservation.c.id, reservation.c.room_id, reservation.c.date,
+                  reservation.c.time, reservation.c.canceled)
+        .order_by(reservation.c.room_id, reservation.c.date, reservation.c.time, reservation.c.id)
+    ).all()
+
+    ends = {}
+    next_start = {}
+    for row in reversed(rows):
+        end = min(_minutes(row.time) + SLOT_MINUTES, 24 * 60 - 1)
+        if not row.canceled:
+            following = next_start.get((row.room_id, row.date))
+            if following is not None:
+                end = min(end, following)
+            next_start[(row.room_id, row.date)] = _minutes(row.time)
+        ends[row.id] = time(*divmod(end, 60))
+
+    update = (
+        reservation.update()
+        .where(reservation.c.id == sa.bindparam('row_id'))
+        .values(end_time=sa.bindparam('end'))
+    )
+    batch = [{'row_id': row_id, 'end': end} for row_id, end in ends.items()]
+    for offset in range(0, len(batch), BATCH_SIZE):
+        bind.execute(update, batch[offset:offset + BATCH_SIZE])
+
+
+def upgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('end_time', sa.Time(), nullable=True))
+
+    _backfill(op.get_bind())
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.Time(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_column('end_time')
@@ -0,0 +1,35 @@
+"""room utilization rollups
+
+Revision ID: d4a7e2b9c815
+Revises: b3e8c1f4a902
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7e2b9c815'
+down_revision = 'b3e8c1f4a902'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('room_utilization',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('room_id', sa.Integer(), nullable=False),
+    sa.Column('hour', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('booked_minutes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['room_id'], ['room.id'], ),
+    sa.PrimaryKeyConstraint('date', 'room_id', 'hour')
+    )
+    # Existing bookings are counted by `flask utilization backfill`, which
+    # must run once after upgrading and before the app serves requests: until
+    # then, canceling a booking made earlier subtracts minutes that were never
+    # added (see README.md).
+
+
+def downgrade():
+    op.drop_table('room_utilization')
@@ -0,0 +1,34 @@
+"""admin listing indexes
+
+Revision ID: e7b3f08a9c61
+Revises: c52d9e3b41a7
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3f08a9c61'
+down_revision = 'c52d9e3b41a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_reservation_live_date_time', 'reservation', ['date', 'time', 'id'],
+        sqlite_where=sa.text('canceled = 0'),
+        postgresql_where=sa.text('NOT canceled'),
+    )
+    op.create_index(
+        'ix_reservation_live_user_date_time', 'reservation', ['user_id', 'date', 'time', 'id'],
+        sqlite_where=sa.text('canceled = 0'),
+        postgresql_where=sa.text('NOT canceled'),
+    )
+
+
+def downgrade():
+    op.drop_index('ix_reservation_live_user_date_time', table_name='reservation')
+    op.drop_index('ix_reservation_live_date_time', table_name='reservation')
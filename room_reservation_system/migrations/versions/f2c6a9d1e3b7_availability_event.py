@@ -0,0 +1,29 @@
+"""availability events
+
+Revision ID: f2c6a9d1e3b7
+Revises: d4a7e2b9c815
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6a9d1e3b7'
+down_revision = 'd4a7e2b9c815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('availability_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('availability_event')
@@ -1,20 +1,75 @@
 # populate_database.py
-from app import create_app, db
-from app.models import User, Room, Reservation
-from werkzeug.security import generate_password_hash
-from datetime import date, time
+#
+# Seeded, deterministic workload generator. Small by default (the admin, a
+# handful of named users, three rooms), scalable to millions of users and tens
+# of millions of reservations for capacity planning:
+#
+#   python populate.py --reset --scale 1000
+#   python populate.py --reset --users 2000000 --rooms 300 --reservations 20000000
+#
+# Rows go in through Core executemany batches; booking times follow a
+# weekday peak-hour profile, a share of bookings are weekly series, and a
+# share are canceled. The same --seed and --start always produce the same
+# dataset.
+import argparse
 import random
+import time as clock
+from datetime import date, timedelta
+from itertools import accumulate
 
-# Initialize the Flask app
-app = create_app()
+from app import create_app, db, password_hasher, utilization
+from app.availability import SLOT_MINUTES, SLOTS_PER_DAY, slot_time
+from app.database import reset_schema, upgrade_schema
+from app.models import User, Room, Reservation
 
 # List of popular animal names for users
 animal_names = [
     "ronaldinho", "garrincha", "abelha", "carlos", "rogerio", "mlkz1k4", "alvenaria", "albert_einstein", "meninoney", "hackerdobem"
 ]
 
-# List of room names
-room_names = ["Room 1", "Room 2", "Room 3"]
+# Synthetic users beyond the named ones all share this password, so that
+# millions of them do not need millions of password hashes.
+SYNTHETIC_PASSWORD = 'populate'
+
+# Relative booking weight of each hour of a weekday; weekends get a fraction.
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 0, 1, 6, 10, 10, 8, 4, 5, 9, 9, 7, 4, 2, 1, 0, 0, 0, 0]
+WEEKEND_FACTOR = 0.15
+DURATIONS = [15, 30, 45, 60, 90, 120]
+DURATION_WEIGHTS = [10, 25, 10, 35, 12, 8]
+SLOTS = range(SLOTS_PER_DAY)
+SLOT_CUM_WEIGHTS = list(accumulate(HOUR_WEIGHTS[slot * SLOT_MINUTES // 60] for slot in SLOTS))
+DURATION_CUM_WEIGHTS = list(accumulate(DURATION_WEIGHTS))
+MAX_PLACEMENT_MISSES = 100
+
+
+class Reporter:
+    def __init__(self, table):
+        self.table = table
+        self.rows = 0
+        self.started = clock.perf_counter()
+
+    def add(self, count):
+        self.rows += count
+
+    def done(self):
+        elapsed = clock.perf_counter() - self.started
+        rate = self.rows / elapsed if elapsed else 0
+        print(f'{self.table}: {self.rows} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec)')
+
+
+def insert_batches(table, rows, batch_size, reporter):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(db.insert(table), batch)
+            reporter.add(len(batch))
+            batch = []
+    if batch:
+        db.session.execute(db.insert(table), batch)
+        reporter.add(len(batch))
+    db.session.commit()
+
 
 def create_admin_user():
     admin = User(username='admin', email='admin@example.com')
@@ -23,70 +78,179 @@ def create_admin_user():
     db.session.add(admin)
     db.session.commit()
 
-def create_random_users(count=8):
-    for i in range(count):
-        username = animal_names[i % len(animal_names)]  # Use animal names
-        email = f"{username.lower()}@example.com"
-        password = animal_names[i % len(animal_names)].lower()  # Password same as username for simplicity
-        contact_phone = f"555-{random.randint(1000, 9999)}"
-        user = User(username=username, email=email, contact_phone=contact_phone)
-        user.set_password(password)
-        db.session.add(user)
-    db.session.commit()
 
-def populate_rooms():
-    # Check if rooms already exist
-    existing_rooms = Room.query.filter(Room.name.in_(room_names)).all()
-    existing_room_names = {room.name for room in existing_rooms}
-    
-    for name in room_names:
-        if name not in existing_room_names:
-            room = Room(name=name)
-            db.session.add(room)
-    db.session.commit()
+def create_users(count, rng, batch_size):
+    reporter = Reporter('user')
+    shared_hash = password_hasher.hash(SYNTHETIC_PASSWORD)
+
+    def rows():
+        for i in range(count):
+            if i < len(animal_names):
+                username = animal_names[i]
+                password_hash = password_hasher.hash(username)  # Password same as username for simplicity
+            else:
+                username = f'user{i:08d}'
+                password_hash = shared_hash
+            yield {
+                'username': username,
+                'email': f'{username}@example.com',
+                'contact_phone': f'555-{rng.randint(1000, 9999)}',
+                'password_hash': password_hash,
+                'is_admin': False,
+            }
+
+    insert_batches(User.__table__, rows(), batch_size, reporter)
+    reporter.done()
+
+
+def populate_rooms(count, batch_size):
+    reporter = Reporter('room')
+    existing = set(db.session.scalars(db.select(Room.name)))
+    names = (f'Room {i}' for i in range(1, count + 1))
+    insert_batches(Room.__table__, ({'name': name} for name in names if name not in existing),
+                   batch_size, reporter)
+    reporter.done()
+
 
-def populate_reservations():
-    users = User.query.all()
-    rooms = Room.query.filter(Room.name.in_(room_names)).all()
-    
-    if not users or not rooms:
+def pick_span(rng):
+    slots = rng.choices(DURATIONS, cum_weights=DURATION_CUM_WEIGHTS)[0] // SLOT_MINUTES
+    start = rng.choices(SLOTS, cum_weights=SLOT_CUM_WEIGHTS)[0]
+    if start + slots >= SLOTS_PER_DAY:
+        slots = SLOTS_PER_DAY - 1 - start
+    return start, max(slots, 1)
+
+
+def room_schedule(rng, room_id, user_ids, first_day, days, target, recurring_rate, cancel_rate):
+    # Yields `target` reservations of one room, or as many as fit. Occupied
+    # slots of each day are tracked in an integer bitmap so live bookings
+    # never overlap; canceled one-offs are drawn without regard to occupancy,
+    # as they would be in real data. A placement that collides is drawn again,
+    # and the room gives up after MAX_PLACEMENT_MISSES misses in a row, by
+    # which point its days are about full.
+    occupied = [0] * days
+    weekday_weight = [WEEKEND_FACTOR if (first_day + timedelta(days=d)).weekday() >= 5 else 1.0
+                      for d in range(days)]
+    day_cum_weights = list(accumulate(weekday_weight))
+    placed = misses = 0
+
+    def row(day, start, slots, user_id, canceled=False):
+        return {
+            'user_id': user_id,
+            'room_id': room_id,
+            'date': first_day + timedelta(days=day),
+            'time': slot_time(start),
+            'end_time': slot_time(start + slots),
+            'canceled': canceled,
+        }
+
+    def claim(day, start, slots):
+        mask = ((1 << slots) - 1) << start
+        if occupied[day] & mask:
+            return False
+        occupied[day] |= mask
+        return True
+
+    # Weekly series: same weekday and time for the whole period, each
+    # occurrence that is still free.
+    recurring = round(target * recurring_rate)
+    while placed < recurring and misses < MAX_PLACEMENT_MISSES:
+        first = rng.randrange(min(days, 7))
+        start, slots = pick_span(rng)
+        user_id = rng.choice(user_ids)
+        before = placed
+        if weekday_weight[first] == 1:
+            for day in range(first, days, 7):
+                if placed == recurring:
+                    break
+                if claim(day, start, slots):
+                    placed += 1
+                    yield row(day, start, slots, user_id, rng.random() < cancel_rate)
+        misses = 0 if placed > before else misses + 1
+
+    # One-off bookings, spread over the days by weekday weight.
+    misses = 0
+    # Canceled ones ride along with live claims, cancel_rate / (1 -
+    # cancel_rate) per claim, so they stay cancel_rate of the rows however
+    # full the days get.
+    extra_canceled = cancel_rate / (1 - cancel_rate) if cancel_rate < 1 else 0
+    while placed < target and misses < MAX_PLACEMENT_MISSES:
+        day = rng.choices(range(days), cum_weights=day_cum_weights)[0]
+        start, slots = pick_span(rng)
+        if not claim(day, start, slots):
+            misses += 1
+            continue
+        misses = 0
+        placed += 1
+        yield row(day, start, slots, rng.choice(user_ids))
+        if placed < target and rng.random() < extra_canceled:
+            placed += 1
+            yield row(day, *pick_span(rng), rng.choice(user_ids), True)
+
+
+def populate_reservations(count, days, first_day, rng, recurring_rate, cancel_rate, batch_size):
+    # Returns the number of reservations inserted, which falls short of
+    # `count` only when the rooms' days are too full to hold them all.
+    user_ids = list(db.session.scalars(db.select(User.id)))
+    room_ids = list(db.session.scalars(db.select(Room.id).order_by(Room.id)))
+
+    if not user_ids or not room_ids:
         print("No users or rooms found. Please ensure they are populated.")
-        return
-    
-    # Create reservations
-    for i in range(10):  # Create 10 reservations as an example
-        user = random.choice(users)
-        room = random.choice(rooms)
-        reservation_date = date.today()
-        reservation_time = time(random.randint(9, 17), random.choice([0, 15, 30, 45]))  # Random time within 9 AM to 5 PM
-        
-        # Check for existing reservation
-        existing_reservation = Reservation.query.filter_by(
-            user_id=user.id,
-            room_id=room.id,
-            date=reservation_date,
-            time=reservation_time
-        ).first()
-
-        if existing_reservation:
-            continue  # Skip if reservation already exists
-
-        reservation = Reservation(
-            user_id=user.id,
-            room_id=room.id,
-            date=reservation_date,
-            time=reservation_time
-        )
-        db.session.add(reservation)
-    db.session.commit()
+        return 0
+
+    reporter = Reporter('reservation')
+    per_room, extra = divmod(count, len(room_ids))
+    rows = (
+        row
+        for i, room_id in enumerate(room_ids)
+        for row in room_schedule(rng, room_id, user_ids, first_day, days, per_room + (i < extra),
+                                 recurring_rate, cancel_rate)
+    )
+    insert_batches(Reservation.__table__, rows, batch_size, reporter)
+    reporter.done()
+    return reporter.rows
+
 
-def populate_database():
+def populate_database(args):
+    app = create_app()
+    if args.reset:
+        reset_schema(app)
+    else:
+        upgrade_schema(app)
+    rng = random.Random(args.seed)
+    scale = args.scale
     with app.app_context():
+        started = clock.perf_counter()
         create_admin_user()
-        create_random_users()
-        populate_rooms()
-        populate_reservations()
-        print("Database populated successfully!")
+        create_users(int(args.users * scale), rng, args.batch_size)
+        populate_rooms(int(args.rooms * scale), args.batch_size)
+        wanted = int(args.reservations * scale)
+        inserted = populate_reservations(
+            wanted, args.days, args.start, rng,
+            args.recurring_rate, args.cancel_rate, args.batch_size,
+        )
+        # Bulk inserts bypass the routes, so count them into the rollups here.
+        utilization.backfill()
+        if inserted < wanted:
+            raise SystemExit(f'Only {inserted} of {wanted} reservations fit in {args.days} days; '
+                             f'use more --days or --rooms.')
+        print(f"Database populated successfully in {clock.perf_counter() - started:.1f}s!")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Populate the database with a synthetic workload.')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--rooms', type=int, default=3)
+    parser.add_argument('--reservations', type=int, default=10)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies users, rooms and reservations')
+    parser.add_argument('--days', type=int, default=28, help='length of the booking period')
+    parser.add_argument('--start', type=date.fromisoformat, default=date.today(), help='first day (YYYY-MM-DD)')
+    parser.add_argument('--recurring-rate', type=float, default=0.3, help='share of bookings in weekly series')
+    parser.add_argument('--cancel-rate', type=float, default=0.08)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='drop and recreate all tables first')
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    populate_database()
+    populate_database(parse_args())
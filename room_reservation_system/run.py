@@ -1,6 +1,6 @@
 from app import create_app
 
-app = create_app()
-
+# `flask run` and WSGI servers build the app themselves from the factory
+# (e.g. gunicorn 'app:create_app()'), so importing this module costs nothing.
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)